@@ -0,0 +1,152 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.counters import recount
+from posts.models import Comment, Group, Post, User
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {number}', author=cls.author,
+                group=cls.group if number % 2 else None
+            )
+            for number in range(settings.SHOWN_POSTS_COUNT + 2)
+        ]
+        cls.post = cls.posts[-1]
+        for number in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {number}'
+            )
+        recount()
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_feeds(self):
+        """Feeds are paged by cursors."""
+        feeds = {
+            reverse('api:index'): self.posts,
+            reverse('api:group_list', kwargs={'slug': 'group'}): [
+                post for post in self.posts if post.group
+            ],
+            reverse('api:profile', kwargs={'username': 'author'}): self.posts,
+        }
+        for url, posts in feeds.items():
+            with self.subTest(url=url):
+                ids = []
+                while url:
+                    data = self.client.get(url).json()
+                    ids += [post['id'] for post in data['results']]
+                    url = data['next']
+                self.assertEqual(ids, [post.pk for post in reversed(posts)])
+        first = self.client.get(reverse('api:index')).json()['results'][0]
+        self.assertEqual(
+            (first['text'], first['author'], first['group'], first['image']),
+            (self.post.text, 'author', 'group', None)
+        )
+
+    def test_post_and_comments(self):
+        """Post is shown with comments' count, comments by pages."""
+        url = reverse('api:post_detail', kwargs={'post_id': self.post.pk})
+        data = self.client.get(url).json()
+        self.assertEqual(
+            (data['id'], data['comments_count']), (self.post.pk, 3)
+        )
+        data = self.client.get(
+            reverse('api:comments', kwargs={'post_id': self.post.pk})
+        ).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['results']],
+            ['Комментарий 2', 'Комментарий 1', 'Комментарий 0']
+        )
+        self.assertIsNone(data['next'])
+
+    def test_fields(self):
+        """Only the asked fields are returned, unknown ones are errors."""
+        url = reverse('api:post_detail', kwargs={'post_id': self.post.pk})
+        self.assertEqual(
+            self.client.get(url, {'fields': 'id,author'}).json(),
+            {'id': self.post.pk, 'author': 'author'}
+        )
+        response = self.client.get(url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['detail'])
+        self.assertNotIn('ETag', response)
+
+    def test_not_found(self):
+        """Missing objects are answered with JSON and no validators."""
+        urls = (
+            reverse('api:post_detail', kwargs={'post_id': 0}),
+            reverse('api:comments', kwargs={'post_id': 0}),
+            reverse('api:group_list', kwargs={'slug': 'missing'}),
+            reverse('api:profile', kwargs={'username': 'missing'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertNotIn('ETag', response)
+
+    def test_not_modified(self):
+        """Unchanged resources are answered with 304 without queries."""
+        urls = (
+            reverse('api:index'),
+            reverse('api:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('api:comments', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                validators = self.client.get(url)
+                self.assertFalse(validators['ETag'].startswith('W/'))
+                with self.assertNumQueries(0):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=validators['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=validators['Last-Modified']
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_changes(self):
+        """Comment changes the post's ETag, editing changes the feed's."""
+        post_url = reverse('api:post_detail', kwargs={'post_id': self.post.pk})
+        feed_url = reverse('api:index')
+        etags = {
+            url: self.client.get(url)['ETag'] for url in (post_url, feed_url)
+        }
+        Comment.objects.create(post=self.post, author=self.author, text='+')
+        response = self.client.get(
+            post_url, HTTP_IF_NONE_MATCH=etags[post_url]
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            feed_url, HTTP_IF_NONE_MATCH=etags[feed_url]
+        )
+        self.assertEqual(response.status_code, 304)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Изменённый пост'
+        post.save()
+        response = self.client.get(
+            feed_url, HTTP_IF_NONE_MATCH=etags[feed_url]
+        )
+        self.assertEqual(response.json()['results'][0]['text'],
+                         'Изменённый пост')
+        self.assertNotEqual(
+            self.client.get(feed_url, {'fields': 'id'})['ETag'],
+            response['ETag']
+        )
+
+    def test_read_only(self):
+        """Writing methods are not allowed."""
+        response = self.client.post(reverse('api:index'))
+        self.assertEqual(response.status_code, 405)
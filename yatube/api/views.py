@@ -0,0 +1,175 @@
+"""
+Read-only JSON API of feeds, posts and comments.
+
+Lists are paged by cursors (?cursor=), ?fields=id,text leaves only
+the named fields. Responses get a strong ETag and Last-Modified from
+the generations of the page cache's scopes (see posts.cache): tokens
+are bumped on every change of the posts and comments shown, so
+a conditional GET is answered with 304 Not Modified after a single
+cache lookup, neither the database nor the serializer is touched.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition, require_safe
+
+from core.replicas import primary_since, read_replica
+from posts.bulk import Encoder
+from posts.cache import generations
+from posts.models import Group, Post, User
+from posts.utils import KeysetPaginator
+
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date,
+    'updated': lambda post: post.updated,
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group else None,
+    'image': lambda post: post.image.url if post.image else None,
+}
+POST_DETAIL_FIELDS = {
+    **POST_FIELDS,
+    'comments_count': lambda post: post.comments_count,
+}
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'post': lambda comment: comment.post_id,
+    'author': lambda comment: comment.author.username,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: comment.created,
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _response(data, status=200):
+    return JsonResponse(
+        data, status=status, encoder=Encoder,
+        json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def _tokens(request, scopes, kwargs):
+    if not hasattr(request, 'api_tokens'):
+        request.api_tokens = generations(
+            *(scope.format(**kwargs) for scope in scopes)
+        )
+        primary_since(max(request.api_tokens))
+    return request.api_tokens
+
+
+def api_view(*scopes):
+    """
+    Makes a GET-only JSON view validated by generations of the scopes,
+    formatted with view's keyword arguments like in cache_generations.
+    Errors are answered with {"detail": message} and no validators.
+    """
+    def etag(request, **kwargs):
+        raw = repr([request.get_full_path(), _tokens(request, scopes, kwargs)])
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, **kwargs):
+        return datetime.fromtimestamp(
+            max(_tokens(request, scopes, kwargs)), tz=timezone.utc
+        )
+
+    def decorator(view):
+        conditional_view = read_replica(condition(etag, last_modified)(view))
+
+        @require_safe
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                return conditional_view(request, *args, **kwargs)
+            except Http404:
+                return _response({'detail': 'Не найдено.'}, status=404)
+            except ApiError as error:
+                return _response({'detail': str(error)}, status=error.status)
+        return wrapper
+    return decorator
+
+
+def _fields(request, available):
+    """Returns {name: getter} of the fields asked by ?fields=."""
+    names = [
+        name.strip() for name in request.GET.get('fields', '').split(',')
+        if name.strip()
+    ]
+    if not names:
+        return available
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}.')
+    return {name: available[name] for name in names}
+
+
+def _serialize(obj, fields):
+    return {name: getter(obj) for name, getter in fields.items()}
+
+
+def _link(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri('?' + query.urlencode())
+
+
+def _page(request, objects, available, field='pub_date'):
+    fields = _fields(request, available)
+    page = KeysetPaginator(
+        objects, settings.SHOWN_POSTS_COUNT, field=field
+    ).get_cursor_page(request.GET.get('cursor'))
+    return _response({
+        'results': [_serialize(obj, fields) for obj in page],
+        'next': _link(request, page.next_cursor()),
+        'previous': _link(request, page.previous_cursor()),
+    })
+
+
+@api_view('feed', 'users', 'groups')
+def index(request):
+    """Returns page of all posts."""
+    return _page(request, Post.objects.for_feed(), POST_FIELDS)
+
+
+@api_view('group:{slug}', 'users', 'groups')
+def group_posts(request, slug):
+    """Returns page of the group's posts."""
+    group = get_object_or_404(Group, slug=slug)
+    return _page(request, group.posts.for_feed(), POST_FIELDS)
+
+
+@api_view('profile:{username}', 'users', 'groups')
+def profile(request, username):
+    """Returns page of the author's posts."""
+    author = get_object_or_404(User, username=username)
+    return _page(request, author.posts.for_feed(), POST_FIELDS)
+
+
+@api_view('post:{post_id}', 'users', 'groups')
+def post_detail(request, post_id):
+    """Returns the post."""
+    fields = _fields(request, POST_DETAIL_FIELDS)
+    post = get_object_or_404(Post.objects.for_feed(), pk=post_id)
+    return _response(_serialize(post, fields))
+
+
+@api_view('post:{post_id}', 'users', 'groups')
+def comments(request, post_id):
+    """Returns page of the post's comments, the latest first."""
+    post = get_object_or_404(Post, pk=post_id)
+    return _page(
+        request, post.comments.select_related('author'), COMMENT_FIELDS,
+        field='created'
+    )
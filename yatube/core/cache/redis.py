@@ -0,0 +1,204 @@
+"""
+Cache backend for Redis-compatible servers (Redis, KeyDB, Valkey...).
+
+Speaks a small subset of RESP over a plain socket, one connection
+per thread, so no client library is required.
+LOCATION: redis://[:password@]host[:port][/db]
+"""
+import pickle
+import socket
+import threading
+from urllib.parse import urlparse
+
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+
+class RedisError(Exception):
+    """Broken connection or protocol."""
+
+
+class ReplyError(RedisError):
+    """Error reply of the server, the connection is still usable."""
+
+
+class Connection:
+    def __init__(self, host, port, timeout):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+    def call(self, *args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        self.sock.sendall(b''.join(parts))
+        return self.read()
+
+    def read(self):
+        line = self.reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise RedisError('Connection is closed by the server')
+        kind, data = line[:1], line[1:-2]
+        if kind == b'+':
+            return data
+        if kind == b'-':
+            raise ReplyError(data.decode())
+        if kind == b':':
+            return int(data)
+        if kind == b'$':
+            length = int(data)
+            if length < 0:
+                return None
+            return self.reader.read(length + 2)[:-2]
+        if kind == b'*':
+            length = int(data)
+            if length < 0:
+                return None
+            return [self.read() for _ in range(length)]
+        raise RedisError(f'Unknown reply: {line!r}')
+
+
+class RedisCache(BaseCache):
+    def __init__(self, server, params):
+        super().__init__(params)
+        url = urlparse(server)
+        self._host = url.hostname or '127.0.0.1'
+        self._port = url.port or 6379
+        self._password = url.password
+        self._db = int(url.path.lstrip('/') or 0)
+        options = params.get('OPTIONS', {})
+        self._socket_timeout = options.get('SOCKET_TIMEOUT', 1)
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = Connection(
+                self._host, self._port, self._socket_timeout
+            )
+            if self._password:
+                connection.call('AUTH', self._password)
+            if self._db:
+                connection.call('SELECT', self._db)
+            self._local.connection = connection
+        return connection
+
+    def _call(self, *args):
+        try:
+            return self._connection().call(*args)
+        except ReplyError:
+            raise
+        except (OSError, RedisError):
+            self._disconnect()
+            raise
+
+    @staticmethod
+    def _dump(value):
+        # Plain integers are stored as is to keep INCRBY working.
+        if type(value) is int:
+            return str(value).encode()
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _load(data):
+        try:
+            return int(data)
+        except ValueError:
+            return pickle.loads(data)
+
+    def _expiry(self, timeout):
+        """Returns PX milliseconds or None for keys without expiry."""
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return None
+        return max(int(timeout * 1000), 0)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _set(self, key, value, timeout, *flags):
+        expiry = self._expiry(timeout)
+        if expiry == 0:
+            self._call('DEL', key)
+            return False
+        args = ['SET', key, self._dump(value), *flags]
+        if expiry is not None:
+            args += ['PX', expiry]
+        return self._call(*args) is not None
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._set(self._key(key, version), value, timeout, 'NX')
+
+    def get(self, key, default=None, version=None):
+        data = self._call('GET', self._key(key, version))
+        return default if data is None else self._load(data)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._set(self._key(key, version), value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        expiry = self._expiry(timeout)
+        if expiry is None:
+            return bool(self._call('PERSIST', key)) or self.has_key(key)
+        return bool(self._call('PEXPIRE', key, expiry))
+
+    def delete(self, key, version=None):
+        self._call('DEL', self._key(key, version))
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self._call('MGET', *(self._key(key, version) for key in keys))
+        return {
+            key: self._load(data)
+            for key, data in zip(keys, values)
+            if data is not None
+        }
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        for key, value in data.items():
+            self.set(key, value, timeout, version)
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._call('DEL', *keys)
+
+    def has_key(self, key, version=None):
+        return bool(self._call('EXISTS', self._key(key, version)))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        if not self._call('EXISTS', key):
+            raise ValueError(f"Key '{key}' not found")
+        try:
+            return self._call('INCRBY', key, delta)
+        except ReplyError as error:
+            raise ValueError(str(error))
+
+    def clear(self):
+        self._call('FLUSHDB')
+
+    def close(self, **kwargs):
+        """Connections are kept between requests."""
+
+    def _disconnect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            self._local.connection = None
+            try:
+                connection.close()
+            except OSError:
+                pass
@@ -0,0 +1,178 @@
+"""
+Two-tier cache: a small per-process LocMemCache (L1) in front of
+a shared cache (L2, e.g. core.cache.redis.RedisCache).
+
+L1 entries live at most L1_TIMEOUT seconds, so a change made by another
+worker is seen after that delay at worst. L1 is shared by the threads
+of the process. When L2 is unavailable the cache keeps working on L1
+alone and doesn't call L2 again for RETRY_AFTER seconds, so requests
+don't wait for its timeouts one after another. get_or_set() is protected
+from stampedes: only the holder of a lock in L2 computes a missing
+value, the others wait for it.
+
+OPTIONS:
+    SHARED: alias of the L2 cache in CACHES;
+    L1_TIMEOUT: seconds to keep values in L1 (5);
+    L1_MAX_ENTRIES: size of L1 (1000);
+    LOCK_TIMEOUT: seconds to compute a value under the lock (10);
+    RETRY_AFTER: seconds to skip L2 after its failure (5).
+"""
+import logging
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+LOCK_POLL_INTERVAL = 0.05
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options['SHARED']
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.lock_timeout = options.get('LOCK_TIMEOUT', 10)
+        self.retry_after = options.get('RETRY_AFTER', 5)
+        self._retry_at = 0
+        # Instances are per thread, the name makes them share entries.
+        self.l1 = LocMemCache(location or 'tiered', {
+            'TIMEOUT': self.l1_timeout,
+            'OPTIONS': {'MAX_ENTRIES': options.get('L1_MAX_ENTRIES', 1000)},
+        })
+
+    @property
+    def l2(self):
+        return caches[self._shared_alias]
+
+    def _l1_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self.l1_timeout
+        return min(timeout, self.l1_timeout)
+
+    def _failed(self):
+        logger.warning('Shared cache is unavailable', exc_info=True)
+        self._retry_at = time.monotonic() + self.retry_after
+
+    def _shared(self, method, *args, fallback=None, **kwargs):
+        """Calls L2, an unavailable L2 gives the fallback."""
+        if time.monotonic() < self._retry_at:
+            return fallback
+        try:
+            return getattr(self.l2, method)(*args, **kwargs)
+        except Exception:
+            self._failed()
+            return fallback
+
+    def _key(self, key, version):
+        return self.make_key(key, version=version)
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        value = self.l1.get(key, MISSING)
+        if value is MISSING:
+            value = self._shared('get', key, MISSING, fallback=MISSING)
+            if value is MISSING:
+                return default
+            self.l1.set(key, value, self.l1_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        found = self.l1.get_many(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            shared = self._shared('get_many', missing, fallback={})
+            self.l1.set_many(shared, self.l1_timeout)
+            found.update(shared)
+        return {keys[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        self._shared('set', key, value, timeout)
+        self.l1.set(key, value, self._l1_timeout(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        data = {self._key(key, version): value for key, value in data.items()}
+        self._shared('set_many', data, timeout)
+        self.l1.set_many(data, self._l1_timeout(timeout))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        added = self._shared('add', key, value, timeout, fallback=MISSING)
+        if added is MISSING:
+            return self.l1.add(key, value, self._l1_timeout(timeout))
+        if added:
+            self.l1.set(key, value, self._l1_timeout(timeout))
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        self.l1.touch(key, self._l1_timeout(timeout))
+        return self._shared('touch', key, timeout, fallback=False)
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self.l1.delete(key)
+        self._shared('delete', key)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        self.l1.delete_many(keys)
+        self._shared('delete_many', keys)
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version) is not MISSING
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        self.l1.delete(key)
+        if time.monotonic() < self._retry_at:
+            return self.l1.incr(key, delta)
+        try:
+            return self.l2.incr(key, delta)
+        except ValueError:
+            raise
+        except Exception:
+            self._failed()
+            return self.l1.incr(key, delta)
+
+    def clear(self):
+        self.l1.clear()
+        self._shared('clear')
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Returns a cached value; a missing one is computed by a single
+        caller holding the lock, the others wait for it.
+        """
+        value = self.get(key, MISSING, version)
+        if value is not MISSING:
+            return value
+        lock = f'{self._key(key, version)}:lock'
+        locked = self.add(lock, 1, self.lock_timeout)
+        if not locked:
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                value = self.get(key, MISSING, version)
+                if value is not MISSING:
+                    return value
+        try:
+            value = default() if callable(default) else default
+            if value is not None:
+                self.set(key, value, timeout, version)
+            return value
+        finally:
+            # After the deadline the value is computed without the lock,
+            # which belongs to another caller then.
+            if locked:
+                self.delete(lock)
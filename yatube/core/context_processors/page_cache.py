@@ -0,0 +1,8 @@
+from django.conf import settings
+
+
+def page_cache(request):
+    """Adds TTL of cached page's fragments."""
+    return {
+        'page_cache_timeout': settings.PAGE_CACHE_TIMEOUT
+    }
@@ -0,0 +1,19 @@
+"""
+Tuning of SQLite connections.
+
+Every new SQLite connection is set up with the SQLITE_PRAGMAS setting,
+e.g. {'journal_mode': 'WAL', 'busy_timeout': 5000}. Connected to
+connection_created by core.apps.
+"""
+from django.conf import settings
+
+
+def apply_pragmas(connection, pragmas):
+    """Sets the pragmas on a DB-API connection to SQLite."""
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+
+
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection.connection, settings.SQLITE_PRAGMAS)
@@ -0,0 +1,87 @@
+"""
+Purging of an HTTP edge cache (a caching reverse proxy) by surrogate keys.
+
+Responses carry the keys of the objects they show in the
+SURROGATE_KEY_HEADER header, space separated. purge() hands the
+affected keys to a background thread after the commit, which sends
+them in one EDGE_PURGE_METHOD request (in the same header) to
+EDGE_PURGE_URL, so the proxy can keep pages for long and drop exactly
+the changed ones. Keys purged while a request is waiting to be sent
+join it; requests never wait for the proxy. Without EDGE_PURGE_URL
+nothing is sent. A failed purge is logged, the write is not undone:
+the proxy's TTL bounds the staleness then.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_keys = set()
+_lock = threading.Lock()
+
+
+def tag(response, *keys):
+    """Adds the surrogate keys to the response's header."""
+    header = settings.SURROGATE_KEY_HEADER
+    tags = response[header].split() if response.has_header(header) else []
+    tags += [key for key in keys if key not in tags]
+    if tags:
+        response[header] = ' '.join(tags)
+    return response
+
+
+def send(keys):
+    """Sends a purge request of the keys at once."""
+    if not settings.EDGE_PURGE_URL or not keys:
+        return
+    request = Request(
+        settings.EDGE_PURGE_URL,
+        method=settings.EDGE_PURGE_METHOD,
+        headers={settings.SURROGATE_KEY_HEADER: ' '.join(sorted(keys))},
+    )
+    try:
+        with urlopen(request, timeout=settings.EDGE_PURGE_TIMEOUT):
+            pass
+    except (URLError, OSError) as error:
+        logger.warning('Purge of %s failed: %s', ' '.join(keys), error)
+
+
+def _flush():
+    with _lock:
+        keys = set(_keys)
+        _keys.clear()
+    send(keys)
+
+
+def _schedule(keys):
+    global _executor
+    with _lock:
+        waiting = bool(_keys)
+        _keys.update(keys)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(1, thread_name_prefix='edge')
+        if not waiting:
+            _executor.submit(_flush)
+
+
+def shutdown():
+    """Waits for the purges being sent and stops the sender."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def purge(*keys):
+    """Purges the keys from the edge cache after the commit."""
+    if settings.EDGE_PURGE_URL:
+        keys = set(keys)
+        transaction.on_commit(lambda: _schedule(keys))
@@ -0,0 +1,158 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.db import apply_pragmas
+
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, '
+    'text TEXT, pub_date REAL)',
+    'CREATE INDEX post_author_date ON post (author_id, pub_date DESC, '
+    'id DESC)',
+)
+READ = (
+    'SELECT id, text FROM post WHERE author_id = ? '
+    'ORDER BY pub_date DESC, id DESC LIMIT 10'
+)
+WRITE = 'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)'
+AUTHORS = 100
+
+
+def read(connection, number):
+    connection.execute(READ, (number % AUTHORS,)).fetchall()
+
+
+def write(connection, number):
+    connection.execute(WRITE, (number % AUTHORS, 'text', time.time()))
+
+
+class Workload:
+    """
+    Readers and writers working on the database for the given seconds.
+    Without persistent connections every operation opens its own,
+    as a request does with CONN_MAX_AGE = 0. Locks are waited for
+    by the busy timeout, so contention shows as the writes' latency.
+    """
+
+    def __init__(self, path, pragmas, persistent):
+        self.path = path
+        self.pragmas = pragmas
+        self.persistent = persistent
+        self.counts = {'reads': 0, 'writes': 0, 'locked': 0}
+        self.latencies = []
+        self.lock = threading.Lock()
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, isolation_level=None)
+        apply_pragmas(connection, self.pragmas)
+        return connection
+
+    def work(self, kind, operation, deadline):
+        number = 0
+        connection = self.connect() if self.persistent else None
+        while time.monotonic() < deadline:
+            number += 1
+            if not self.persistent:
+                connection = self.connect()
+            started = time.perf_counter()
+            try:
+                operation(connection, number)
+                key = kind
+            except sqlite3.OperationalError as error:
+                if 'locked' not in str(error):
+                    raise
+                key = 'locked'
+            if not self.persistent:
+                connection.close()
+            with self.lock:
+                self.counts[key] += 1
+                if key == 'writes':
+                    self.latencies.append(time.perf_counter() - started)
+        if self.persistent:
+            connection.close()
+
+    def journal_mode(self):
+        connection = self.connect()
+        try:
+            return connection.execute('PRAGMA journal_mode').fetchone()[0]
+        finally:
+            connection.close()
+
+    def write_latency(self, share):
+        """Returns the latency of the share of the writes in seconds."""
+        latencies = sorted(self.latencies) or [0]
+        return latencies[min(int(len(latencies) * share), len(latencies) - 1)]
+
+    def run(self, readers, writers, seconds):
+        """Returns the amounts of reads, writes and "database is locked"."""
+        deadline = time.monotonic() + seconds
+        threads = [
+            threading.Thread(target=self.work, args=('reads', read, deadline))
+            for _ in range(readers)
+        ] + [
+            threading.Thread(
+                target=self.work, args=('writes', write, deadline)
+            )
+            for _ in range(writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counts = self.counts
+        return counts['reads'], counts['writes'], counts['locked']
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures reads and writes per second and latency of writes '
+        'of concurrent threads on a scratch SQLite database with '
+        'the default settings and with SQLITE_TUNED_PRAGMAS and '
+        'persistent connections.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--posts', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        profiles = (
+            ('default', {}, False),
+            ('tuned', settings.SQLITE_TUNED_PRAGMAS, True),
+        )
+        seconds = options['seconds']
+        for name, pragmas, persistent in profiles:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'benchmark.sqlite3')
+                self.seed(path, options['posts'])
+                workload = Workload(path, pragmas, persistent)
+                reads, writes, locked = workload.run(
+                    options['readers'], options['writers'], seconds
+                )
+                journal_mode = workload.journal_mode()
+            median = workload.write_latency(0.5) * 1000
+            slowest = workload.write_latency(0.99) * 1000
+            self.stdout.write(
+                f'{name} ({journal_mode}): {reads / seconds:.0f} reads/s, '
+                f'{writes / seconds:.0f} writes/s, write latency '
+                f'{median:.1f} ms median, {slowest:.1f} ms p99, '
+                f'{locked} locked'
+            )
+
+    def seed(self, path, amount):
+        connection = sqlite3.connect(path)
+        with connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+            connection.executemany(WRITE, (
+                (number % AUTHORS, 'text', number) for number in range(amount)
+            ))
+        connection.close()
@@ -0,0 +1,86 @@
+"""
+Reading from replicas of the database.
+
+Views opt in with @read_replica: their reads go to one of the
+DATABASE_REPLICAS, chosen per request. Writes always go to the primary
+('default'). A client which has written something is pinned to the
+primary for REPLICA_PIN_SECONDS (by a cookie set in ReplicaMiddleware),
+so it reads its own writes despite the replication lag. Any client
+reads from the primary for that long after the data it shows changed
+(see primary_since), so pages cached for the new data are not rendered
+from the old rows.
+"""
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+
+
+PIN_COOKIE = 'primary_pin'
+
+_state = threading.local()
+
+
+def _replica():
+    return getattr(_state, 'replica', None)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if getattr(_state, 'wrote', False):
+            return None
+        return _replica()
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+
+def pinned(request) -> bool:
+    return PIN_COOKIE in request.COOKIES
+
+
+def read_replica(view):
+    """Sends reads of the view to a replica unless the client is pinned."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.DATABASE_REPLICAS or pinned(request):
+            return view(request, *args, **kwargs)
+        _state.replica = random.choice(settings.DATABASE_REPLICAS)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.replica = None
+    return wrapper
+
+
+def primary_since(timestamp):
+    """
+    Sends further reads of the request to the primary if the data
+    changed at the timestamp may be not replicated yet.
+    """
+    if time.time() - timestamp < settings.REPLICA_PIN_SECONDS:
+        _state.replica = None
+
+
+class ReplicaMiddleware:
+    """Pins the client to the primary after the request has written."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.wrote = False
+        response = self.get_response(request)
+        if _state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+        return response
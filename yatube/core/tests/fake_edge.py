@@ -0,0 +1,50 @@
+"""In-process HTTP server recording purge requests of core.edge."""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+
+
+class FakeEdgeHandler(BaseHTTPRequestHandler):
+    def handle_one_request(self):
+        # Answers any method: PURGE, BAN, POST...
+        self.raw_requestline = self.rfile.readline(65537)
+        if not self.raw_requestline or not self.parse_request():
+            return
+        self.server.purges.append((
+            self.command,
+            set(self.headers.get(settings.SURROGATE_KEY_HEADER, '').split()),
+        ))
+        self.send_response(self.server.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeEdgeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeEdgeHandler)
+        self.purges = []
+        self.status = 200
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f'http://{host}:{port}/purge'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def keys(self):
+        """Returns all keys purged so far."""
+        return set().union(*(keys for _, keys in self.purges))
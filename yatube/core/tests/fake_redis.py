@@ -0,0 +1,129 @@
+"""In-process server speaking the subset of RESP used by RedisCache."""
+import socketserver
+import threading
+import time
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line.startswith(b'*'):
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            with self.server.lock:
+                reply = self.server.execute(
+                    args[0].decode().upper(), args[1:]
+                )
+            self.wfile.write(reply)
+
+
+def bulk(value):
+    if value is None:
+        return b'$-1\r\n'
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeRedisHandler)
+        self.lock = threading.Lock()
+        self.data = {}
+        self.expires = {}
+        self.commands = []
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f'redis://{host}:{port}/0'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _alive(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def execute(self, command, args):
+        self.commands.append(command)
+        handler = getattr(self, f'do_{command.lower()}', None)
+        if handler is None:
+            return b'-ERR unknown command\r\n'
+        return handler(*args)
+
+    def do_ping(self):
+        return b'+PONG\r\n'
+
+    def do_select(self, db):
+        return b'+OK\r\n'
+
+    def do_get(self, key):
+        return bulk(self.data[key] if self._alive(key) else None)
+
+    def do_mget(self, *keys):
+        values = [self.data[key] if self._alive(key) else None
+                  for key in keys]
+        return b'*%d\r\n' % len(keys) + b''.join(map(bulk, values))
+
+    def do_set(self, key, value, *flags):
+        flags = [flag.upper() for flag in flags]
+        if b'NX' in flags and self._alive(key):
+            return bulk(None)
+        self.data[key] = value
+        self.expires.pop(key, None)
+        if b'PX' in flags:
+            milliseconds = int(flags[flags.index(b'PX') + 1])
+            self.expires[key] = time.monotonic() + milliseconds / 1000
+        return b'+OK\r\n'
+
+    def do_del(self, *keys):
+        deleted = [key for key in keys if self._alive(key)]
+        for key in deleted:
+            self.data.pop(key)
+            self.expires.pop(key, None)
+        return b':%d\r\n' % len(deleted)
+
+    def do_exists(self, key):
+        return b':%d\r\n' % self._alive(key)
+
+    def do_incrby(self, key, delta):
+        try:
+            value = int(self.data.get(key, b'0')) + int(delta)
+        except ValueError:
+            return b'-ERR value is not an integer\r\n'
+        self.data[key] = str(value).encode()
+        return b':%d\r\n' % value
+
+    def do_pexpire(self, key, milliseconds):
+        if not self._alive(key):
+            return b':0\r\n'
+        self.expires[key] = time.monotonic() + int(milliseconds) / 1000
+        return b':1\r\n'
+
+    def do_persist(self, key):
+        return b':%d\r\n' % (self.expires.pop(key, None) is not None)
+
+    def do_flushdb(self):
+        self.data.clear()
+        self.expires.clear()
+        return b'+OK\r\n'
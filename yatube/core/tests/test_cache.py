@@ -0,0 +1,157 @@
+import itertools
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import override_settings, SimpleTestCase
+
+from ..cache import tiered
+from ..cache.redis import RedisCache
+from .fake_redis import FakeRedisServer
+
+
+class RedisCacheTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeRedisServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.cache = RedisCache(self.server.url, {})
+        self.cache.clear()
+
+    def test_get_set(self):
+        """Values survive the round trip through the server."""
+        values = {'int': 7, 'str': 'текст', 'dict': {'a': [1, 2]}}
+        self.cache.set_many(values)
+        for key, value in values.items():
+            with self.subTest(key=key):
+                self.assertEqual(self.cache.get(key), value)
+        self.assertEqual(self.cache.get_many(['int', 'nope']), {'int': 7})
+        self.assertIsNone(self.cache.get('nope'))
+
+    def test_add_incr_delete(self):
+        """add() keeps the old value, incr() is atomic on the server."""
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 5))
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr('nope')
+        self.cache.delete('counter')
+        self.assertFalse(self.cache.has_key('counter'))
+
+    def test_expiry(self):
+        """Timeouts are sent as PX."""
+        self.cache.set('short', 1, 0.05)
+        self.cache.set('forever', 1, None)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertEqual(self.cache.get('forever'), 1)
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.server = FakeRedisServer().start()
+        self.settings_override = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'core.cache.tiered.TieredCache',
+                'OPTIONS': {'SHARED': 'shared', 'L1_TIMEOUT': 60},
+            },
+            'shared': {
+                'BACKEND': 'core.cache.redis.RedisCache',
+                'LOCATION': self.server.url,
+            },
+        })
+        self.settings_override.enable()
+        self.cache = caches['default']
+        self.cache.clear()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.server.stop()
+
+    def test_l1_in_front_of_l2(self):
+        """Values are read from L1 without calling the server."""
+        self.cache.set('key', 'value')
+        calls = len(self.server.commands)
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(len(self.server.commands), calls)
+        self.cache.l1.clear()
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.server.commands[-1], 'GET')
+
+    def test_local_fallback(self):
+        """Cache keeps working on L1 when the server is down."""
+        self.server.stop()
+        caches['shared']._disconnect()
+        with self.assertLogs('core.cache.tiered', 'WARNING'):
+            self.cache.set('key', 'value')
+            self.assertEqual(self.cache.get('key'), 'value')
+            self.assertTrue(self.cache.add('lock', 1))
+            self.assertFalse(self.cache.add('lock', 1))
+
+    def test_stampede_protection(self):
+        """Concurrent misses compute the value only once."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    caches['default'].get_or_set('hot', compute)
+                )
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_l1_is_shared_by_threads(self):
+        """Threads of the process share L1 entries."""
+        thread = threading.Thread(
+            target=lambda: caches['default'].l1.set('key', 'value')
+        )
+        thread.start()
+        thread.join()
+        self.assertEqual(self.cache.l1.get('key'), 'value')
+
+    def test_foreign_lock_is_kept(self):
+        """A caller which waited the lock out doesn't delete it."""
+        lock = self.cache.make_key('hot') + ':lock'
+        self.assertTrue(self.cache.add(lock, 'other'))
+        # Every call of the clock is 100 seconds later.
+        clock = itertools.count(0, 100)
+        with mock.patch.object(tiered.time, 'monotonic', lambda: next(clock)):
+            self.assertEqual(self.cache.get_or_set('hot', 'value'), 'value')
+        self.assertEqual(self.cache.get(lock), 'other')
+
+    def test_circuit_breaker(self):
+        """After a failure L2 isn't called for RETRY_AFTER seconds."""
+        shared = caches['shared']
+        with mock.patch.object(
+            shared, 'get', side_effect=ConnectionError
+        ) as get, self.assertLogs('core.cache.tiered', 'WARNING') as logs:
+            self.assertIsNone(self.cache.get('first'))
+            self.assertIsNone(self.cache.get('second'))
+            self.assertEqual((get.call_count, len(logs.output)), (1, 1))
+            retry_at = time.monotonic() + self.cache.retry_after
+            with mock.patch.object(
+                tiered.time, 'monotonic', lambda: retry_at
+            ):
+                self.assertIsNone(self.cache.get('third'))
+            self.assertEqual(get.call_count, 2)
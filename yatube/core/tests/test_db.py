@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import override_settings, SimpleTestCase
+
+
+class SQLiteTuningTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def pragmas(self):
+        """Returns journal_mode and synchronous of a new connection."""
+        wrapper = DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': os.path.join(self.directory, 'db.sqlite3'),
+        })
+        try:
+            with wrapper.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+                cursor.execute('PRAGMA synchronous')
+                return journal_mode, cursor.fetchone()[0]
+        finally:
+            wrapper.close()
+
+    def test_default(self):
+        """SQLite's defaults are kept unless tuning is asked for."""
+        self.assertEqual(self.pragmas(), ('delete', 2))
+
+    def test_tuned(self):
+        """New connections get SQLITE_PRAGMAS."""
+        with override_settings(SQLITE_PRAGMAS=settings.SQLITE_TUNED_PRAGMAS):
+            self.assertEqual(self.pragmas(), ('wal', 1))
+
+    def test_benchmark(self):
+        """Benchmark reports throughput and latency of both profiles."""
+        out = StringIO()
+        call_command(
+            'benchmark_sqlite', seconds=0.1, posts=100, readers=1, writers=1,
+            stdout=out
+        )
+        lines = out.getvalue().splitlines()
+        # The tuned profile has to be measured in WAL mode indeed.
+        self.assertEqual([line.split(':')[0] for line in lines],
+                         ['default (delete)', 'tuned (wal)'])
+        for line in lines:
+            self.assertRegex(
+                line,
+                r'\d+ reads/s, \d+ writes/s, write latency '
+                r'[\d.]+ ms median, [\d.]+ ms p99, \d+ locked'
+            )
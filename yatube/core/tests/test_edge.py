@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import override_settings, SimpleTestCase
+
+from .. import edge
+from .fake_edge import FakeEdgeServer
+
+
+class EdgeTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeEdgeServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.purges.clear()
+        self.server.status = 200
+        settings = override_settings(EDGE_PURGE_URL=self.server.url)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_tag(self):
+        """Keys are added to the header once."""
+        response = edge.tag(HttpResponse(), 'post:1', 'feed:index')
+        edge.tag(response, 'post:1', 'group:cats')
+        self.assertEqual(
+            response['Surrogate-Key'], 'post:1 feed:index group:cats'
+        )
+        self.assertFalse(edge.tag(HttpResponse()).has_header('Surrogate-Key'))
+
+    def test_purge_after_commit(self):
+        """Keys are sent in a single request after the commit."""
+        callbacks = []
+        with mock.patch.object(transaction, 'on_commit', callbacks.append):
+            edge.purge('post:1', 'feed:index', 'post:1')
+        self.assertEqual(self.server.purges, [])
+        for callback in callbacks:
+            callback()
+        edge.shutdown()
+        self.assertEqual(
+            self.server.purges, [('PURGE', {'post:1', 'feed:index'})]
+        )
+        with override_settings(EDGE_PURGE_METHOD='BAN'):
+            edge.send({'group:cats'})
+        self.assertEqual(self.server.purges[-1], ('BAN', {'group:cats'}))
+
+    def test_purges_are_batched(self):
+        """Keys purged while a request waits are sent with it."""
+        with mock.patch.object(edge, 'send') as send:
+            with mock.patch.object(edge, '_flush'):
+                edge._schedule({'post:1'})
+                edge._schedule({'post:2'})
+                edge.shutdown()
+            edge._flush()
+        send.assert_called_once_with({'post:1', 'post:2'})
+
+    def test_disabled(self):
+        """Without the endpoint nothing is scheduled."""
+        with override_settings(EDGE_PURGE_URL=''):
+            with mock.patch.object(transaction, 'on_commit') as on_commit:
+                edge.purge('post:1')
+        on_commit.assert_not_called()
+
+    def test_failure(self):
+        """Failed purges are logged and don't raise."""
+        self.server.status = 503
+        with self.assertLogs('core.edge', 'WARNING'):
+            edge.send({'post:1'})
+        with override_settings(EDGE_PURGE_URL='http://127.0.0.1:9/'):
+            with self.assertLogs('core.edge', 'WARNING'):
+                edge.send({'post:1'})
@@ -1,6 +1,48 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.http import StreamingHttpResponse
 
+from . import bulk, search
 from .models import Group, Post
+from .utils import EstimatedCountPaginator
+
+
+class JoinedAutocompleteSelect(AutocompleteSelect):
+    """
+    Autocomplete which renders the chosen objects given in `known`
+    instead of querying them, so list_editable costs no query per row.
+    """
+    known = ()
+
+    def optgroups(self, name, value, attr=None):
+        known = {str(obj.pk): obj for obj in self.known}
+        chosen = {
+            str(pk) for pk in value
+            if str(pk) not in self.choices.field.empty_values
+        }
+        if not chosen <= set(known):
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        for pk in chosen:
+            label = self.choices.field.label_from_instance(known[pk])
+            options.append(
+                self.create_option(name, pk, label, True, len(options))
+            )
+        return [(None, options, 0)]
+
+
+class PostChangeListForm(forms.ModelForm):
+    """Row of the changelist: the group is taken from the joined post."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        widget = self.fields['group'].widget
+        widget = getattr(widget, 'widget', widget)
+        if self.instance.group_id is not None:
+            widget.known = (self.instance.group,)
 
 
 @admin.register(Post)
@@ -9,14 +51,50 @@ class PostAdmin(admin.ModelAdmin):
     Allows to show and edit post's parametrs.
     Displayed fields: post's id, text, date, author, group.
     Editable fields: group.
-    Available search by: text.
+    Available search by: text (through the full-text index).
     Available filter by: date of publication.
+    Author and group are joined to the list and chosen with autocomplete,
+    the list is counted from the database statistics.
+    Selected posts can be exported to gzip-compressed JSONL.
     """
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('export',)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs['widget'] = JoinedAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using')
+            )
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_form(self, request, **kwargs):
+        kwargs.setdefault('form', PostChangeListForm)
+        return super().get_changelist_form(request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search.backend().filter(queryset, search_term), False
+
+    def export(self, request, queryset):
+        response = StreamingHttpResponse(
+            bulk.gzipped(bulk.export(queryset)),
+            content_type='application/gzip'
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="posts.jsonl.gz"'
+        )
+        return response
+    export.short_description = 'Выгрузить выбранные посты в JSONL'
 
 
 @admin.register(Group)
@@ -25,12 +103,14 @@ class GroupAdmin(admin.ModelAdmin):
     Allows to show and edit group's parametrs.
     Displayed fields: group's id, title, description, path.
     Editable fields: title, description.
-    Available search by: description.
+    Available search by: title, description.
     Available filter by: title.
     """
     list_display = ('pk', 'title', 'description', 'slug',)
     list_editable = ('title', 'description',)
-    search_fields = ('description',)
+    search_fields = ('title', 'description',)
     list_filter = ('title',)
     empty_value_display = '-пусто-'
     ordering = ('pk',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,278 @@
+"""
+Benchmark of the posts app.
+
+seed() fills the database with generated users, groups, posts, comments
+and follows. As on real sites, a few authors write most of the posts and
+a few have most of the followers: both are drawn from Zipf's law.
+Rows are inserted with plain INSERTs in batches, denormalized counters,
+timelines and the search index are rebuilt afterwards (see posts.bulk).
+
+measure() requests every URL of posts.urls which doesn't write with the
+test client and reports latency percentiles, queries and peak of
+allocated memory per request. compare() finds regressions against
+a report saved before.
+"""
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Max
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import bulk
+from .models import Comment, Follow, Group, Post, User
+from .urls import app_name, urlpatterns
+
+
+BATCH_SIZE = 10000
+ZIPF_EXPONENT = 1.0
+WORDS = (
+    'день жизнь время город дом друг книга работа утро вечер море лето '
+    'зима весна осень дорога мысль история фото кот собака чай кофе '
+    'новый старый хороший большой первый последний важный тихий '
+    'читать писать думать гулять видеть знать любить ждать помнить '
+    'сегодня завтра вчера снова очень почти всегда никогда рядом'
+).split()
+# Views which change data on GET.
+WRITING = {'delete_post', 'add_comment', 'profile_follow', 'profile_unfollow'}
+# Views shown to a logged in user: "author" of the post or "reader".
+LOGIN = {'post_create': 'author', 'post_edit': 'author',
+         'follow_index': 'reader'}
+
+
+def _next_pk(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def _insert(model, fields, rows):
+    """Inserts rows of values of the fields in batches."""
+    fields = [model._meta.get_field(name) for name in fields]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        model._meta.db_table,
+        ', '.join(field.column for field in fields),
+        ', '.join(['%s'] * len(fields))
+    )
+    batch = []
+    with connection.cursor() as cursor:
+        for row in rows:
+            batch.append([
+                field.get_db_prep_save(value, connection)
+                for field, value in zip(fields, row)
+            ])
+            if len(batch) == BATCH_SIZE:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+
+
+def _zipf(rng, objects):
+    """Returns a function choosing k of objects in random Zipf's ranks."""
+    objects = list(objects)
+    rng.shuffle(objects)
+    weights = list(accumulate(
+        1 / rank ** ZIPF_EXPONENT for rank in range(1, len(objects) + 1)
+    ))
+    return lambda k: rng.choices(objects, cum_weights=weights, k=k)
+
+
+def seed(users, posts, groups=100, follows=10, comments=None, days=365,
+         random_seed=0):
+    """
+    Adds the users, groups and posts; every user follows `follows`
+    authors on average, comments are a fifth of posts by default.
+    Should run in a transaction.
+    """
+    rng = random.Random(random_seed)
+    now = timezone.now()
+    first_user = _next_pk(User)
+    user_pks = range(first_user, first_user + users)
+    _insert(
+        User,
+        ('id', 'username', 'password', 'is_superuser', 'first_name',
+         'last_name', 'email', 'is_staff', 'is_active', 'date_joined'),
+        ((pk, f'user{pk}', UNUSABLE_PASSWORD_PREFIX, False, '', '', '',
+          False, True, now) for pk in user_pks)
+    )
+    first_group = _next_pk(Group)
+    group_pks = range(first_group, first_group + groups)
+    _insert(
+        Group, ('id', 'title', 'slug', 'description', 'posts_count'),
+        ((pk, f'Сообщество {pk}', f'group-{pk}', 'Описание', 0)
+         for pk in group_pks)
+    )
+
+    followed = _zipf(rng, user_pks)
+    follow_pairs = set()
+    for user in user_pks:
+        amount = int(follows * (rng.paretovariate(2) - 1))
+        follow_pairs.update(
+            (user, author) for author in followed(min(amount, users))
+            if author != user
+        )
+    _insert(Follow, ('user', 'author'), sorted(follow_pairs))
+
+    start = now - timedelta(days=days)
+    dates = sorted(
+        start + timedelta(seconds=rng.uniform(0, days * 24 * 60 * 60))
+        for _ in range(posts)
+    )
+    first_post = _next_pk(Post)
+    authors = _zipf(rng, user_pks)(posts)
+    # A third of posts are out of groups.
+    post_groups = _zipf(rng, list(group_pks) + [None] * (groups // 2))(posts)
+    _insert(
+        Post,
+        ('id', 'text', 'pub_date', 'updated', 'author', 'group', 'image',
+         'comments_count'),
+        ((first_post + number, _text(rng), date, date, authors[number],
+          post_groups[number], '', 0) for number, date in enumerate(dates))
+    )
+
+    if comments is None:
+        comments = posts // 5
+    commented = _zipf(rng, range(posts))
+    _insert(
+        Comment, ('post', 'author', 'text', 'created'),
+        ((first_post + number, rng.choice(user_pks), _text(rng),
+          dates[number] + timedelta(minutes=rng.randint(1, 600)))
+         for number in commented(comments))
+    )
+
+    bulk.reset_sequences(User, Group, Post)
+    bulk.rebuild_derived()
+
+
+def _text(rng):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(3, 60))).capitalize()
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of the values."""
+    values = sorted(values)
+    return values[max(0, round(fraction * len(values)) - 1)]
+
+
+def _most(model, field):
+    """Returns pk of the field's object having the most of model's rows."""
+    return model.objects.order_by().values(field).annotate(
+        total=Count('pk')
+    ).order_by('-total', field)[0][field]
+
+
+def targets(author, group):
+    """
+    Returns {url's name: (url, client's role)} for every URL
+    of posts.urls which doesn't write.
+    """
+    kwargs = {
+        'post_id': Post.objects.filter(author=author).first().pk,
+        'username': author.username,
+        'slug': group.slug,
+    }
+    urls = {}
+    for pattern in urlpatterns:
+        if pattern.name in WRITING:
+            continue
+        url = reverse(f'{app_name}:{pattern.name}', kwargs={
+            name: kwargs[name] for name in pattern.pattern.converters
+        })
+        if pattern.name == 'search':
+            url += f'?q={WORDS[0]}'
+        urls[pattern.name] = (url, LOGIN.get(pattern.name))
+    return urls
+
+
+def measure(requests=50, warm=False):
+    """
+    Returns {url's name: {'url', 'p50_ms', 'p99_ms', 'queries',
+    'peak_kib'}}. Pages are rendered anew each time unless warm.
+    """
+    # The heaviest pages: of the most active author, of the largest
+    # group, follow's feed of the user following the most authors.
+    author = User.objects.get(pk=_most(Post, 'author'))
+    reader = User.objects.get(pk=_most(Follow, 'user'))
+    group = Group.objects.order_by('-posts_count').first()
+    clients = {None: Client()}
+    for role, user in (('author', author), ('reader', reader)):
+        clients[role] = Client()
+        clients[role].force_login(user)
+    report = {}
+    for name, (url, role) in targets(author, group).items():
+        client = clients[role]
+        client.get(url)
+        latencies = []
+        queries = 0
+        for _ in range(requests):
+            if not warm:
+                cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise AssertionError(f'{url}: {response.status_code}')
+            queries = max(queries, len(context.captured_queries))
+        if not warm:
+            cache.clear()
+        tracemalloc.start()
+        client.get(url)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        report[name] = {
+            'url': url,
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'queries': queries,
+            'peak_kib': peak // 1024,
+        }
+    return report
+
+
+def _speed(report, baseline):
+    """
+    Returns how many times the report's machine is slower than the
+    baseline's one: the median ratio of p50 latencies of common pages.
+    """
+    ratios = sorted(
+        report[name]['p50_ms'] / base['p50_ms']
+        for name, base in baseline.items()
+        if name in report and base['p50_ms']
+    )
+    return ratios[len(ratios) // 2] if ratios else 1
+
+
+def compare(report, baseline, latency_tolerance=1.0, memory_tolerance=0.25,
+            relative=False):
+    """
+    Returns descriptions of regressions of the report: any extra query,
+    latency or memory exceeding the baseline by more than the tolerance.
+    Relative latencies are scaled by the machines' speed first, so only
+    pages slowing down against the others are regressions.
+    """
+    speed = _speed(report, baseline) if relative else 1
+    regressions = []
+    for name, base in baseline.items():
+        if name not in report:
+            continue
+        result = report[name]
+        limits = (
+            ('queries', base['queries']),
+            ('p50_ms', base['p50_ms'] * speed * (1 + latency_tolerance)),
+            ('p99_ms', base['p99_ms'] * speed * (1 + latency_tolerance)),
+            ('peak_kib', base['peak_kib'] * (1 + memory_tolerance)),
+        )
+        for key, limit in limits:
+            if result[key] > limit:
+                regressions.append(
+                    f'{name}: {key} {result[key]} > {base[key]}'
+                )
+    return regressions
@@ -0,0 +1,315 @@
+"""
+Bulk loading of users, groups, posts, comments and follows,
+streaming export of posts.
+
+Rows are read from JSONL or CSV files (optionally gzipped), keyed by
+model's field names (author or author_id), and inserted with
+bulk_create() in batches of rows; "manage.py import_posts" loads all
+the files in a single transaction, batches are savepoints in it.
+Users and groups may be referred to by username and slug, posts' rows
+may carry their comments nested: rows written by export() are loaded
+back as they are.
+Dates are kept as given, auto_now fields are filled only when missing.
+No signals are sent: counters, timelines and the search index are
+rebuilt by rebuild_derived(), pages cached before are not invalidated.
+
+export() streams posts in (pub_date, id) order with their author,
+group and comments, chunk by chunk; an export may continue from the
+last exported post (the watermark).
+"""
+import csv
+import gzip
+import json
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import groupby, islice
+
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import counters, search, timelines
+from .models import Comment, Group, Post, User
+
+
+BATCH_SIZE = 5000
+
+# Fields identifying related objects given by a string instead of id.
+NATURAL_KEYS = {User: User.USERNAME_FIELD, Group: 'slug'}
+
+
+def read(path):
+    """Yields rows of the file as dicts."""
+    name = path[:-len('.gz')] if path.endswith('.gz') else path
+    if not name.endswith(('.jsonl', '.csv')):
+        raise ValueError(f'{path} is neither JSONL nor CSV.')
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as file:
+        if name.endswith('.csv'):
+            yield from csv.DictReader(file)
+            return
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _auto_dates(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+
+
+@contextmanager
+def _given_dates(model):
+    """Makes auto_now fields keep the values given."""
+    fields = {
+        field: (field.auto_now, field.auto_now_add)
+        for field in _auto_dates(model)
+    }
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in fields.items():
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _objects(model, rows, auto_dates):
+    now = timezone.now()
+    for row in rows:
+        values = {}
+        for key, value in row.items():
+            field = model._meta.get_field(key)
+            if value == '' and field.null:
+                value = None
+            values[field.attname] = field.to_python(value)
+        obj = model(**values)
+        for field in auto_dates:
+            if getattr(obj, field.attname) is None:
+                setattr(obj, field.attname, now)
+        yield obj
+
+
+def _natural(value):
+    return isinstance(value, str) and value != '' and not value.isdigit()
+
+
+def _resolved(model, rows):
+    """Replaces usernames and slugs of related objects by their ids."""
+    for field in model._meta.concrete_fields:
+        if not field.is_relation or field.related_model not in NATURAL_KEYS:
+            continue
+        names = {
+            row[field.name] for row in rows if _natural(row.get(field.name))
+        }
+        if not names:
+            continue
+        key = NATURAL_KEYS[field.related_model]
+        ids = dict(field.related_model.objects.filter(
+            **{f'{key}__in': names}
+        ).values_list(key, 'pk'))
+        missing = names - set(ids)
+        if missing:
+            raise ValueError(
+                f'Unknown {field.name}: {", ".join(sorted(missing))}.'
+            )
+        for row in rows:
+            if _natural(row.get(field.name)):
+                row.pop(field.attname, None)
+                row[field.name] = ids[row[field.name]]
+    return rows
+
+
+def _nested_comments(rows):
+    """Pops comments nested in posts' rows."""
+    comments = []
+    for row in rows:
+        nested = row.pop('comments', None) or []
+        if nested and row.get('id') in (None, ''):
+            raise ValueError('Post with comments has no id.')
+        comments += [{**comment, 'post': row['id']} for comment in nested]
+    return comments
+
+
+def _create(model, rows, auto_dates):
+    model.objects.bulk_create(
+        _objects(model, _resolved(model, rows), auto_dates[model])
+    )
+
+
+def load(model, rows, batch_size=BATCH_SIZE):
+    """
+    Inserts the rows to model's table, posts with their nested comments.
+    Returns amount of the rows.
+    """
+    count = 0
+    rows = iter(rows)
+    auto_dates = {model: _auto_dates(model), Comment: _auto_dates(Comment)}
+    with _given_dates(model), _given_dates(Comment):
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            comments = _nested_comments(batch) if model is Post else []
+            with transaction.atomic():
+                _create(model, batch, auto_dates)
+                if comments:
+                    _create(Comment, comments, auto_dates)
+            count += len(batch)
+    return count
+
+
+def _secondary_indexes(cursor, table):
+    """Returns {name: SQL creating it} of non-unique indexes of the table."""
+    names = [
+        name for name, constraint in connection.introspection.get_constraints(
+            cursor, table
+        ).items()
+        if constraint['index'] and not constraint['unique']
+        and not constraint['primary_key']
+    ]
+    if not names:
+        return {}
+    placeholders = ', '.join(['%s'] * len(names))
+    if connection.vendor == 'sqlite':
+        cursor.execute(
+            'SELECT name, sql FROM sqlite_master WHERE type = %s '
+            f'AND name IN ({placeholders}) AND sql IS NOT NULL',
+            ['index', *names]
+        )
+    elif connection.vendor == 'postgresql':
+        cursor.execute(
+            'SELECT indexname, indexdef FROM pg_indexes '
+            f'WHERE indexname IN ({placeholders})',
+            names
+        )
+    else:
+        return {}
+    return dict(cursor.fetchall())
+
+
+@contextmanager
+def without_indexes(*models):
+    """
+    Drops non-unique indexes of the models' tables and creates them
+    again on exit: building an index once is faster than keeping it
+    up to date row by row.
+    """
+    with connection.cursor() as cursor:
+        indexes = {}
+        for model in models:
+            indexes.update(_secondary_indexes(cursor, model._meta.db_table))
+        for name in indexes:
+            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for sql in indexes.values():
+                cursor.execute(sql)
+
+
+def reset_sequences(*models):
+    """Moves sequences of primary keys past the ids inserted."""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+@transaction.atomic
+def rebuild_derived():
+    """Recomputes counters, timelines, search index and DB statistics."""
+    counters.recount()
+    timelines.rebuild()
+    search.backend().rebuild()
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def since(posts, watermark):
+    """Narrows posts to those after the watermark (pub_date, id)."""
+    pub_date, pk = watermark
+    return posts.filter(
+        Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+    )
+
+
+def _comments(post_ids):
+    comments = Comment.objects.filter(post_id__in=post_ids).select_related(
+        'author'
+    ).only(
+        'created', 'post', 'text', 'author__username'
+    ).order_by('post_id', 'created', 'pk')
+    return {
+        post_id: [
+            {
+                'id': comment.pk,
+                'author_id': comment.author_id,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created': comment.created,
+            }
+            for comment in post_comments
+        ]
+        for post_id, post_comments in groupby(
+            comments, key=lambda comment: comment.post_id
+        )
+    }
+
+
+def export(posts, chunk_size=BATCH_SIZE):
+    """
+    Yields dicts of the posts in (pub_date, id) order. Posts are read
+    by a single query chunk by chunk, comments by a query per chunk.
+    """
+    posts = posts.for_feed().order_by('pub_date', 'pk').iterator(
+        chunk_size=chunk_size
+    )
+    while True:
+        chunk = list(islice(posts, chunk_size))
+        if not chunk:
+            return
+        comments = _comments([post.pk for post in chunk])
+        for post in chunk:
+            yield {
+                'id': post.pk,
+                'text': post.text,
+                'pub_date': post.pub_date,
+                'updated': post.updated,
+                'image': post.image.name,
+                'author_id': post.author_id,
+                'author': post.author.username,
+                'group_id': post.group_id,
+                'group': post.group.slug if post.group else None,
+                'comments': comments.get(post.pk, []),
+            }
+
+
+class Encoder(DjangoJSONEncoder):
+    """Keeps microseconds of dates: they are a part of the watermark."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def to_json(row):
+    return json.dumps(row, cls=Encoder, ensure_ascii=False)
+
+
+def gzipped(rows):
+    """Yields gzip-compressed JSONL of the rows."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for row in rows:
+        data = compressor.compress((to_json(row) + '\n').encode())
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,253 @@
+"""
+Versioned page caching.
+
+Every cached page depends on a few scopes ("feed", "group:<slug>",
+"profile:<username>", "post:<id>", "author:<id>" for the author's
+counters; "users" and "groups" for names shown on every page).
+A scope has a generation token kept in the cache; the page's cache key
+includes tokens of its scopes.
+Saving or deleting a model bumps tokens of the affected scopes
+(see posts.signals), so stale pages are never hit again and the TTL
+only limits memory usage. Signals bump the tokens again after the
+commit (bump_on_commit): a page rendered by a concurrent request
+before the commit shows the old rows, it must not stay cached under
+the new tokens.
+
+Pages are cached in two layers. Anonymous responses have no personal
+parts and are cached whole by serve_stale(). Authenticated responses
+are rendered on
+every request, but their user-invariant body (post cards, comments)
+is a {% cache %} fragment keyed on request.cache_version, shared by
+all users; the header, follow buttons and CSRF token stay per request.
+
+serve_stale() keeps a single copy per URL with the version it was
+rendered for. When the version changes or the copy gets older than
+PAGE_CACHE_TIMEOUT, one request (holding a lock in the cache)
+renders the page again while the others are served the stale copy;
+identical renders running in a process at once are made only once.
+A stale copy is served for PAGE_STALE_TIMEOUT more seconds, also when
+the database fails.
+
+The tokens are the pages' versions for HTTP as well: a weak ETag of
+the cache version, the user and the URL and Last-Modified of the
+latest token let browsers and proxies revalidate a page and get
+304 Not Modified without a query or a render.
+"""
+import hashlib
+import logging
+import pickle
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+
+from core.replicas import primary_since
+
+logger = logging.getLogger(__name__)
+
+LOCK_TIMEOUT = 10
+
+_renders = {}
+_renders_lock = threading.Lock()
+
+
+def _key(scope):
+    return 'generation:' + hashlib.md5(scope.encode()).hexdigest()
+
+
+def generations(*scopes):
+    """Returns tokens of the scopes; a missing token is started anew."""
+    keys = [_key(scope) for scope in scopes]
+    tokens = cache.get_many(keys)
+    missing = [key for key in keys if key not in tokens]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time(), None)
+        tokens.update(cache.get_many(missing))
+    return [tokens.get(key, 0) for key in keys]
+
+
+def bump(*scopes):
+    """Starts new generations of the scopes."""
+    token = time.time()
+    cache.set_many({_key(scope): token for scope in scopes}, None)
+
+
+def bump_on_commit(*scopes):
+    """
+    Starts new generations of the scopes now and after the commit:
+    pages cached in between may show uncommitted rows' old state.
+    """
+    bump(*scopes)
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+def _etag(request, *args, version=None, **kwargs):
+    raw = repr([
+        version or request.cache_version,
+        request.user.pk,
+        request.get_full_path(),
+    ])
+    # Weak: the CSRF token differs in every rendering.
+    return 'W/"{}"'.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def _last_modified(request, *args, **kwargs):
+    return request.cache_modified
+
+
+def page_key(url):
+    """Returns the cache key of the page at the absolute URL."""
+    return 'page:' + hashlib.md5(url.encode()).hexdigest()
+
+
+def _coalesced(key, render):
+    """
+    Calls render() unless a call with the key is running in the process;
+    then waits for that call. Returns the pickled result: a response
+    can't be shared by requests.
+    """
+    with _renders_lock:
+        future = _renders.get(key)
+        leader = future is None
+        if leader:
+            future = _renders[key] = Future()
+    if not leader:
+        return future.result()
+    try:
+        result = pickle.dumps(render(), pickle.HIGHEST_PROTOCOL)
+    except BaseException as error:
+        future.set_exception(error)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _renders_lock:
+            del _renders[key]
+
+
+def _stale(request, entry):
+    """Returns the entry's response validated by the entry's version."""
+    version, modified, _, response = entry
+    response['ETag'] = _etag(request, version=version)
+    response['Last-Modified'] = http_date(modified.timestamp())
+    return response
+
+
+def _fresh(request, entry, timeout):
+    version, _, stored, _ = entry
+    return version == request.cache_version and time.time() - stored < timeout
+
+
+def _render(request, key, entry, render):
+    """
+    Returns a new response and True; if the database fails, the entry's
+    response and False. The caller holds the key's lock if there is
+    an entry.
+    """
+    try:
+        return pickle.loads(_coalesced(key, render)), True
+    except DatabaseError:
+        if entry is None:
+            raise
+        logger.warning('Stale page is served', exc_info=True)
+        return _stale(request, entry), False
+    finally:
+        if entry is not None:
+            cache.delete(f'{key}:lock')
+
+
+def serve_stale(timeout, stale_timeout):
+    """
+    Caches GET responses of the view for request.cache_version,
+    serving a stale copy while the page is rendered again (see above).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            key = page_key(request.build_absolute_uri())
+            entry = cache.get(key)
+            if entry is not None:
+                if _fresh(request, entry, timeout):
+                    return entry[-1]
+                if not cache.add(f'{key}:lock', 1, LOCK_TIMEOUT):
+                    return _stale(request, entry)
+            response, rendered = _render(
+                request, key, entry, lambda: view(request, *args, **kwargs)
+            )
+            if (rendered and response.status_code == 200
+                    and request.method == 'GET'):
+                cache.set(key, (
+                    request.cache_version, request.cache_modified,
+                    time.time(), response,
+                ), timeout + stale_timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+def _patch_headers(response, request):
+    """
+    Makes clients revalidate the page before every use; the edge cache
+    keeps guests' pages until they are purged (see core.edge).
+    """
+    patch_vary_headers(response, ('Cookie',))
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, max_age=0)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=settings.PAGE_MAX_AGE
+        )
+        if settings.EDGE_PURGE_URL:
+            patch_cache_control(response, s_maxage=settings.EDGE_MAX_AGE)
+    patch_cache_control(response, must_revalidate=True)
+
+
+def cache_generations(*scopes, timeout=None):
+    """
+    Caches the view keyed on generations of scopes.
+    Scopes are formatted with view's keyword arguments:
+    @cache_generations('post:{post_id}'); a callable scope is called
+    with them.
+    Sets request.cache_version for the template's fragments
+    and answers conditional GET by it.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            names = [
+                scope(**kwargs) if callable(scope) else scope.format(**kwargs)
+                for scope in scopes
+            ]
+            tokens = generations(*names)
+            primary_since(max(tokens))
+            request.cache_version = hashlib.md5(
+                repr(list(zip(names, tokens))).encode()
+            ).hexdigest()
+            request.cache_modified = datetime.fromtimestamp(
+                max(tokens), tz=timezone.utc
+            )
+            cached_view = view
+            if not request.user.is_authenticated:
+                cached_view = serve_stale(
+                    timeout or settings.PAGE_CACHE_TIMEOUT,
+                    settings.PAGE_STALE_TIMEOUT
+                )(view)
+            response = condition(_etag, _last_modified)(cached_view)(
+                request, *args, **kwargs
+            )
+            _patch_headers(response, request)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,184 @@
+"""
+Denormalized counters: posts and followers per author, posts per group,
+comments per post. Signals of posts, comments and follows (see
+posts.signals) change them with atomic F() updates, so admin, shell and
+cascade deletes keep them too; "manage.py recount_counters" recomputes
+all of them.
+
+feed_count() gives approximate totals of feeds for numbered pages
+from the counters and the database statistics; totals are cached
+for FEED_COUNT_TIMEOUT seconds and are not invalidated on writes.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from . import timelines
+from .models import AuthorStat, Comment, Follow, Group, Post
+from .utils import EstimatedCountPaginator
+
+
+def _change_author(author_id, delta, field='posts_count'):
+    stats = AuthorStat.objects.filter(author_id=author_id)
+    updated = stats.filter(**{f'{field}__gte': -delta}).update(
+        **{field: F(field) + delta}
+    )
+    if updated or delta < 0:
+        # A missing row is not made on decrements: the author may be
+        # being deleted. Drift below zero waits for the recount.
+        return
+    # No row yet: take the exact values once.
+    try:
+        with transaction.atomic():
+            stats.delete()
+            followers = Follow.objects.filter(author_id=author_id).count()
+            AuthorStat.objects.create(
+                author_id=author_id,
+                posts_count=Post.objects.filter(author_id=author_id).count(),
+                followers_count=followers,
+                fan_out_on_read=followers > settings.FOLLOW_FANOUT_LIMIT
+            )
+    except IntegrityError:
+        _change_author(author_id, delta, field)
+
+
+def _change_group(group_id, delta):
+    if group_id is not None:
+        Group.objects.filter(
+            pk=group_id, posts_count__gte=-delta
+        ).update(posts_count=F('posts_count') + delta)
+
+
+def post_created(post):
+    _change_author(post.author_id, 1)
+    _change_group(post.group_id, 1)
+
+
+def post_deleted(post):
+    _change_author(post.author_id, -1)
+    _change_group(post.group_id, -1)
+
+
+def post_moved(post, old_group_id):
+    """Moves the post between groups' counters after group's change."""
+    if post.group_id != old_group_id:
+        _change_group(old_group_id, -1)
+        _change_group(post.group_id, 1)
+
+
+def comment_created(comment):
+    Post.objects.filter(pk=comment.post_id).update(
+        comments_count=F('comments_count') + 1
+    )
+
+
+def comment_deleted(comment):
+    Post.objects.filter(pk=comment.post_id, comments_count__gt=0).update(
+        comments_count=F('comments_count') - 1
+    )
+
+
+def follow_created(follow):
+    _change_author(follow.author_id, 1, 'followers_count')
+
+
+def follow_deleted(follow):
+    _change_author(follow.author_id, -1, 'followers_count')
+
+
+def _count_of(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0
+    )
+
+
+@transaction.atomic
+def recount():
+    """Recomputes all counters with a few bulk queries."""
+    Group.objects.update(posts_count=_count_of(Post, 'group'))
+    Post.objects.update(comments_count=_count_of(Comment, 'post'))
+    read_on_request = set(AuthorStat.objects.filter(
+        fan_out_on_read=True
+    ).values_list('author_id', flat=True))
+    AuthorStat.objects.all().delete()
+    stats = {}
+    for model, field in (
+        (Post, 'posts_count'),
+        (Follow, 'followers_count'),
+    ):
+        rows = model.objects.order_by().values('author').annotate(
+            total=Count('pk')
+        )
+        for row in rows:
+            stat = stats.setdefault(
+                row['author'], AuthorStat(author_id=row['author'])
+            )
+            setattr(stat, field, row['total'])
+    for stat in stats.values():
+        # Switching back is left to "manage.py resume_fan_out".
+        stat.fan_out_on_read = (
+            stat.author_id in read_on_request
+            or stat.followers_count > settings.FOLLOW_FANOUT_LIMIT
+        )
+    AuthorStat.objects.bulk_create(stats.values())
+
+
+def _feed_total():
+    return EstimatedCountPaginator(Post.objects.all(), 1).count
+
+
+def _group_total(group_id):
+    return Group.objects.filter(pk=group_id).values_list(
+        'posts_count', flat=True
+    ).first() or 0
+
+
+def _author_total(author_id):
+    return AuthorStat.objects.filter(author_id=author_id).values_list(
+        'posts_count', flat=True
+    ).first() or 0
+
+
+def _follow_total(user_id):
+    celebrity = Q(fan_out_on_read=True)
+    totals = AuthorStat.objects.filter(
+        author__following__user=user_id
+    ).aggregate(
+        celebrities=Sum('posts_count', filter=celebrity),
+        others=Sum('posts_count', filter=~celebrity),
+    )
+    celebrities = totals['celebrities'] or 0
+    others = totals['others'] or 0
+    if not timelines.enabled():
+        return celebrities + others
+    # Timelines keep only the latest posts of the authors fanned out.
+    return celebrities + min(others, settings.FOLLOW_TIMELINE_SIZE)
+
+
+FEED_TOTALS = {
+    'feed': _feed_total,
+    'group': _group_total,
+    'profile': _author_total,
+    'follow': _follow_total,
+}
+
+
+def feed_count(feed, *args):
+    """
+    Returns the cached approximate amount of posts in the feed:
+    feed_count('feed'), feed_count('group', group_id),
+    feed_count('profile', author_id), feed_count('follow', user_id).
+    """
+    key = ':'.join(['feed-count', feed, *map(str, args)])
+    return cache.get_or_set(
+        key, lambda: FEED_TOTALS[feed](*args), settings.FEED_COUNT_TIMEOUT
+    )
@@ -1,5 +1,8 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 
+from . import thumbnails, uploads
 from .models import Comment, Post
 
 
@@ -12,6 +15,37 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Limits are checked before ImageField decodes the upload.
+        self.image_error = None
+        key = self.add_prefix('image')
+        image = self.files.get(key)
+        if image:
+            try:
+                uploads.check_limits(image)
+            except ValidationError as error:
+                self.image_error = error
+                self.files = self.files.copy()
+                del self.files[key]
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            return uploads.normalize(image)
+        return image
+
+    def clean(self):
+        if self.image_error:
+            self.add_error('image', self.image_error)
+        return super().clean()
+
+    def save(self, commit=True):
+        post = super().save(commit)
+        if 'image' in self.changed_data:
+            thumbnails.schedule(post)
+        return post
+
 
 class CommentForm(forms.ModelForm):
     """
@@ -0,0 +1,67 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures latency, queries and memory of the pages of posts '
+        'on the current database (see seed_posts) and compares them '
+        'with the baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Keep the page cache between requests.'
+        )
+        parser.add_argument(
+            '--baseline',
+            help='Report to compare with; regressions fail the command.'
+        )
+        parser.add_argument('--save', help='File to save the report to.')
+        parser.add_argument(
+            '--latency-tolerance', type=float, default=1.0,
+            help='Allowed growth of latency, 1.0 is twice slower.'
+        )
+        parser.add_argument(
+            '--relative-latency', action='store_true',
+            help='Compare latency relative to the speed of the machine, '
+                 'estimated as the median slowdown of all pages.'
+        )
+        parser.add_argument(
+            '--memory-tolerance', type=float, default=0.25,
+            help='Allowed growth of peak memory.'
+        )
+
+    def handle(self, *args, **options):
+        report = benchmark.measure(options['requests'], options['warm'])
+        self.stdout.write(
+            f'{"page":<14}{"p50, ms":>9}{"p99, ms":>9}'
+            f'{"queries":>9}{"KiB":>7}'
+        )
+        for name, result in report.items():
+            self.stdout.write(
+                f'{name:<14}{result["p50_ms"]:>9}{result["p99_ms"]:>9}'
+                f'{result["queries"]:>9}{result["peak_kib"]:>7}'
+            )
+        if options['save']:
+            with open(options['save'], 'w') as file:
+                json.dump(report, file, indent=4, sort_keys=True)
+                file.write('\n')
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+            regressions = benchmark.compare(
+                report, baseline,
+                options['latency_tolerance'], options['memory_tolerance'],
+                options['relative_latency']
+            )
+            if regressions:
+                raise CommandError(
+                    'Regressions:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('No regressions.'))
@@ -0,0 +1,77 @@
+import gzip
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from posts import bulk
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Writes posts with their author, group and comments to '
+        'gzip-compressed JSONL in (pub_date, id) order. With --watermark '
+        'the export continues after the post exported last time.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output', help='File to write, e.g. posts.jsonl.gz.'
+        )
+        parser.add_argument(
+            '--since', help='Export posts published after this ISO date.'
+        )
+        parser.add_argument(
+            '--since-id', type=int, default=0,
+            help='Posts published at --since exactly are exported '
+                 'after this id.'
+        )
+        parser.add_argument(
+            '--watermark', metavar='FILE',
+            help='JSON file with the last exported pub_date and id, '
+                 'read before and updated after the export.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=bulk.BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        watermark = self.watermark(options)
+        posts = Post.objects.all()
+        if watermark is not None:
+            posts = bulk.since(posts, watermark)
+        started = time.monotonic()
+        count = 0
+        last = None
+        with gzip.open(options['output'], 'wt', encoding='utf-8') as file:
+            for row in bulk.export(posts, options['chunk_size']):
+                file.write(bulk.to_json(row) + '\n')
+                count += 1
+                last = row
+        seconds = time.monotonic() - started
+        if last is not None and options['watermark']:
+            with open(options['watermark'], 'w') as file:
+                file.write(bulk.to_json(
+                    {'pub_date': last['pub_date'], 'id': last['id']}
+                ))
+        self.stdout.write(self.style.SUCCESS(
+            f'{count} posts are exported in {seconds:.1f} s.'
+        ))
+
+    def watermark(self, options):
+        """Returns (pub_date, id) to export after or None."""
+        since, since_id = options['since'], options['since_id']
+        path = options['watermark']
+        if since is None and path and os.path.exists(path):
+            with open(path) as file:
+                stored = json.load(file)
+            since, since_id = stored['pub_date'], stored['id']
+        if since is None:
+            return None
+        pub_date = parse_datetime(since)
+        if pub_date is None:
+            raise CommandError(f'Wrong date: {since}.')
+        return pub_date, since_id
@@ -0,0 +1,91 @@
+import time
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, IntegrityError, transaction
+
+from posts import bulk
+from posts.models import Comment, Follow, Group, Post, User
+
+
+# In the order of their foreign keys.
+MODELS = {
+    'users': User,
+    'groups': Group,
+    'posts': Post,
+    'comments': Comment,
+    'follows': Follow,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Loads users, groups, posts, comments and follows from JSONL or '
+        'CSV files (.gz too) with rows keyed by field names, e.g. made by '
+        'export_posts: authors and groups may be given by username and '
+        'slug, comments nested in posts. Everything is loaded in one '
+        'transaction; counters, timelines and the search index are '
+        'rebuilt afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        for name in MODELS:
+            parser.add_argument(f'--{name}', metavar='FILE')
+        parser.add_argument(
+            '--batch-size', type=int, default=bulk.BATCH_SIZE,
+            help='Rows per bulk_create() chunk; all go in one transaction.'
+        )
+        parser.add_argument(
+            '--keep-indexes', action='store_true',
+            help="Don't drop secondary indexes while loading."
+        )
+
+    def handle(self, *args, **options):
+        files = {
+            name: model for name, model in MODELS.items() if options[name]
+        }
+        if not files:
+            raise CommandError('Nothing to import.')
+        started = time.monotonic()
+        models = list(files.values())
+        try:
+            if options['keep_indexes']:
+                self.load(files, options)
+            else:
+                with bulk.without_indexes(*models):
+                    self.load(files, options)
+                self.stdout.write(
+                    f'indexes: {time.monotonic() - self.loaded:.1f} s'
+                )
+        except (
+            OSError, ValueError, FieldDoesNotExist, ValidationError,
+            IntegrityError
+        ) as error:
+            raise CommandError(error)
+        bulk.reset_sequences(*models)
+        started_derived = time.monotonic()
+        bulk.rebuild_derived()
+        self.stdout.write(
+            f'derived data: {time.monotonic() - started_derived:.1f} s'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported in {time.monotonic() - started:.1f} s.'
+        ))
+
+    @transaction.atomic
+    def load(self, files, options):
+        for name, model in files.items():
+            started = time.monotonic()
+            count = bulk.load(
+                model, bulk.read(options[name]), options['batch_size']
+            )
+            seconds = time.monotonic() - started
+            self.stdout.write(
+                f'{name}: {count} rows in {seconds:.1f} s, '
+                f'{count / max(seconds, 1e-6):.0f} rows/s'
+            )
+        # As in loaddata: deferred foreign keys are checked now.
+        connection.check_constraints(table_names=[
+            model._meta.db_table for model in {*files.values(), Comment}
+        ])
+        self.loaded = time.monotonic()
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Indexes all posts for the full-text search anew.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search.backend().rebuild()
+        self.stdout.write(self.style.SUCCESS('Search index is rebuilt.'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timelines
+
+
+class Command(BaseCommand):
+    help = "Refills follow's timelines from the follow graph."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            timelines.rebuild()
+        self.stdout.write(self.style.SUCCESS('Timelines are rebuilt.'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import timelines
+
+
+class Command(BaseCommand):
+    help = (
+        'Pushes posts of the authors dropped to FOLLOW_FANOUT_RESUME '
+        "followers to their followers' timelines again."
+    )
+
+    def handle(self, *args, **options):
+        resumed = sum(
+            timelines.resume(author_id)
+            for author_id in list(timelines.resumable())
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Authors pushed again: {resumed}.')
+        )
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Adds generated users, groups, posts, comments and follows '
+        'for benchmarks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Authors followed by a user on average.'
+        )
+        parser.add_argument('--comments', type=int)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            benchmark.seed(
+                options['users'], options['posts'],
+                groups=options['groups'],
+                follows=options['follows'],
+                comments=options['comments'],
+                random_seed=options['seed'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Database is seeded in {time.monotonic() - started:.0f} s.'
+        ))
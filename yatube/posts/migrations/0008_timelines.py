@@ -0,0 +1,71 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_timelines(apps, schema_editor):
+    AuthorStat = apps.get_model('posts', 'AuthorStat')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    rows = Follow.objects.order_by().values('author').annotate(
+        total=models.Count('pk')
+    )
+    for row in rows:
+        AuthorStat.objects.update_or_create(
+            author_id=row['author'],
+            defaults={'followers_count': row['total']}
+        )
+    if not settings.FOLLOW_TIMELINE:
+        return
+    for follow in Follow.objects.all():
+        if AuthorStat.objects.filter(
+            author_id=follow.author_id,
+            followers_count__gt=settings.FOLLOW_FANOUT_LIMIT
+        ).exists():
+            continue
+        posts = Post.objects.filter(author_id=follow.author_id).order_by(
+            '-pub_date'
+        )[:settings.FOLLOW_TIMELINE_SIZE]
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(
+                user_id=follow.user_id, post=post, pub_date=post.pub_date
+            )
+            for post in posts
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0007_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstat',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество подписчиков'),
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date'], name='posts_timeline_user_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique posts_timelineentry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+import re
+
+from django.db import migrations
+
+from posts.stemmer import stem
+
+
+WORD = re.compile(r'\w+')
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Post = apps.get_model('posts', 'Post')
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+        "text, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    for pk, text in Post.objects.values_list('pk', 'text').iterator():
+        schema_editor.execute(
+            'INSERT INTO posts_post_fts (rowid, text) VALUES (%s, %s)',
+            [pk, ' '.join(stem(word) for word in WORD.findall(text.lower()))]
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE posts_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 09:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_fan_out_on_read(apps, schema_editor):
+    AuthorStat = apps.get_model('posts', 'AuthorStat')
+    AuthorStat.objects.filter(
+        followers_count__gt=settings.FOLLOW_FANOUT_LIMIT
+    ).update(fan_out_on_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstat',
+            name='fan_out_on_read',
+            field=models.BooleanField(default=False, verbose_name='Посты читаются при запросе ленты'),
+        ),
+        migrations.RunPython(mark_fan_out_on_read, migrations.RunPython.noop),
+    ]
@@ -4,10 +4,29 @@ from django.db import models
 
 from core.models import CreatedModel
 
+from .storage import ContentAddressedStorage
+
 
 User = get_user_model()
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """
+        Joins author and group used by post's card in a single query
+        and leaves out their columns which are never shown in feeds.
+        """
+        return self.select_related('author', 'group').defer(
+            'author__password',
+            'author__last_login',
+            'author__email',
+            'author__is_staff',
+            'author__is_active',
+            'author__date_joined',
+            'group__description',
+        )
+
+
 class Post(models.Model):
     """
     Post's object on the site.
@@ -22,6 +41,10 @@ class Post(models.Model):
         db_index=True,
         verbose_name='Дата публикации'
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -40,19 +63,50 @@ class Post(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
+        db_index=True,
         blank=True,
         help_text='Выберете файл с изображением'
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев'
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Profile's and group's feeds, in their (-pub_date, -pk) order.
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='posts_post_author_date'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='posts_post_group_date'
+            ),
+        ]
 
     def __str__(self):
         """Returns title of class's object."""
         return self.text[:settings.POST_TITLE_LEN]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers loaded group to invalidate it after group's change
+        and image to release it after image's change.
+        """
+        post = super().from_db(db, field_names, values)
+        post._loaded_group_id = post.__dict__.get('group_id')
+        post._loaded_image = post.__dict__.get('image')
+        return post
+
 
 class Group(models.Model):
     """
@@ -74,6 +128,11 @@ class Group(models.Model):
         verbose_name='Описание',
         help_text='Краткое описание сообщества'
     )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество постов'
+    )
 
     class Meta:
         ordering = ['pk']
@@ -82,6 +141,43 @@ class Group(models.Model):
         """Returns title of class's object."""
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remembers loaded slug to invalidate it after slug's change."""
+        group = super().from_db(db, field_names, values)
+        group._loaded_slug = group.__dict__.get('slug')
+        return group
+
+
+class AuthorStat(models.Model):
+    """
+    Denormalized counters of the author.
+    Kept by posts.counters, repaired by "manage.py recount_counters".
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stat',
+        verbose_name='Автор'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков'
+    )
+    fan_out_on_read = models.BooleanField(
+        default=False,
+        verbose_name='Посты читаются при запросе ленты'
+    )
+
+    def __str__(self):
+        """Returns title of class's object."""
+        return f'{self.author}: {self.posts_count}'
+
 
 class Comment(CreatedModel):
     """
@@ -108,6 +204,11 @@ class Comment(CreatedModel):
 
     class Meta:
         ordering = ['created']
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='posts_comment_post_created'
+            ),
+        ]
 
     def __str__(self):
         """Returns title of class's object."""
@@ -137,3 +238,43 @@ class Follow(models.Model):
                 name='unique posts_follow'
             )
         ]
+        # Authors followed by the user; the constraint serves the reverse.
+        indexes = [
+            models.Index(
+                fields=['user', 'author'], name='posts_follow_user_author'
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """
+    Post pushed to the follower's timeline (fan-out-on-write).
+    Kept by posts.timelines.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique posts_timelineentry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date'],
+                name='posts_timeline_user_date'
+            )
+        ]
@@ -0,0 +1,224 @@
+"""
+Full-text search over posts.
+
+Texts are split into words and stemmed (posts.stemmer) before indexing,
+queries are stemmed the same way, so "публикации" finds "публикация".
+The index is kept by a pluggable backend (POST_SEARCH_BACKEND) and
+synced by posts.signals. Results are ordered by (rank, pk) and paginated
+with cursors on that pair, like the feeds are on (pub_date, pk).
+"""
+import base64
+import binascii
+import re
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.core.paginator import Page
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .stemmer import stem
+from .utils import CURSOR_NEXT, CURSOR_PREVIOUS
+
+
+WORD = re.compile(r'\w+')
+BATCH_SIZE = 1000
+
+
+def terms(text):
+    """Returns stemmed words of the text."""
+    return [stem(word) for word in WORD.findall(text.lower())]
+
+
+def encode_cursor(direction, position):
+    rank, pk = position
+    raw = f'{direction}{rank!r}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns (direction, (rank, pk)) or None if cursor is broken."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        direction, raw = raw[0], raw[1:]
+        rank, pk = raw.rsplit('|', 1)
+        rank, pk = float(rank), int(pk)
+    except (binascii.Error, UnicodeError, ValueError, IndexError):
+        return None
+    if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS):
+        return None
+    return direction, (rank, pk)
+
+
+class SearchBackend(ABC):
+    """Interface of the search backends."""
+
+    @abstractmethod
+    def index(self, post):
+        """Adds the post to the index or updates it there."""
+
+    @abstractmethod
+    def remove(self, pk):
+        """Removes the post from the index."""
+
+    @abstractmethod
+    def rebuild(self):
+        """Indexes all posts anew."""
+
+    @abstractmethod
+    def filter(self, posts, query):
+        """Returns the queryset of posts narrowed to the matching ones."""
+
+    @abstractmethod
+    def search(self, query, position=None, backwards=False, limit=None):
+        """
+        Returns [(rank, pk)] of posts matching the query ordered by
+        (rank, pk): the best first. Only rows after the position
+        (or before it, backwards) are returned, the nearest first.
+        """
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    SQLite FTS5 table of stemmed texts (see migration 0011), rowid is
+    the post's pk. Rank is bm25(), the lower the better.
+    """
+    table = 'posts_post_fts'
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [post.pk]
+            )
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)',
+                [post.pk, ' '.join(terms(post.text))]
+            )
+
+    def remove(self, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [pk])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            rows = Post.objects.order_by().values_list('pk', 'text')
+            batch = []
+            for pk, text in rows.iterator(chunk_size=BATCH_SIZE):
+                batch.append((pk, ' '.join(terms(text))))
+                if len(batch) == BATCH_SIZE:
+                    self._insert(cursor, batch)
+                    batch = []
+            self._insert(cursor, batch)
+
+    def _insert(self, cursor, rows):
+        cursor.executemany(
+            f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)', rows
+        )
+
+    def _match(self, query):
+        return ' '.join(f'"{term}"*' for term in terms(query))
+
+    def filter(self, posts, query):
+        match = self._match(query)
+        if not match:
+            return posts.none()
+        return posts.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+            [match]
+        ))
+
+    def search(self, query, position=None, backwards=False, limit=None):
+        match = self._match(query)
+        if not match:
+            return []
+        sql = (
+            f'SELECT rank, rowid FROM (SELECT bm25({self.table}) AS rank, '
+            f'rowid FROM {self.table} WHERE {self.table} MATCH %s)'
+        )
+        params = [match]
+        if position is not None:
+            rank, pk = position
+            lookup = '<' if backwards else '>'
+            sql += (
+                f' WHERE rank {lookup} %s'
+                f' OR (rank = %s AND rowid {lookup} %s)'
+            )
+            params += [rank, rank, pk]
+        order = ' DESC' if backwards else ''
+        sql += f' ORDER BY rank{order}, rowid{order} LIMIT %s'
+        params.append(limit or settings.SHOWN_POSTS_COUNT)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class ScanBackend(SearchBackend):
+    """
+    Backend for databases without full-text search: every word is
+    looked for with LIKE, newest posts go first (rank is -pk).
+    Nothing is indexed and words are not stemmed.
+    """
+    def index(self, post):
+        pass
+
+    def remove(self, pk):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def filter(self, posts, query):
+        words = WORD.findall(query)
+        if not words:
+            return posts.none()
+        for word in words:
+            posts = posts.filter(text__icontains=word)
+        return posts
+
+    def search(self, query, position=None, backwards=False, limit=None):
+        posts = self.filter(
+            Post.objects.order_by('pk' if backwards else '-pk'), query
+        )
+        if position is not None:
+            lookup = 'pk__gt' if backwards else 'pk__lt'
+            posts = posts.filter(**{lookup: position[1]})
+        pks = posts.values_list('pk', flat=True)[
+            :limit or settings.SHOWN_POSTS_COUNT
+        ]
+        return [(float(-pk), pk) for pk in pks]
+
+
+def backend():
+    return import_string(settings.POST_SEARCH_BACKEND)()
+
+
+def search_page(query, cursor=None):
+    """
+    Returns a page of posts found by the query.
+    Like KeysetPaginator.get_cursor_page() the page has no number,
+    but has next_cursor() and previous_cursor() methods.
+    """
+    per_page = settings.SHOWN_POSTS_COUNT
+    decoded = decode_cursor(cursor) if cursor else None
+    position, backwards = None, False
+    if decoded is not None:
+        direction, position = decoded
+        backwards = direction == CURSOR_PREVIOUS
+    rows = backend().search(query, position, backwards, per_page + 1)
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+    posts = Post.objects.for_feed().in_bulk([pk for _, pk in rows])
+    page = Page([posts[pk] for _, pk in rows if pk in posts], None, None)
+    next_cursor = previous_cursor = None
+    if rows and (backwards or has_more):
+        next_cursor = encode_cursor(CURSOR_NEXT, rows[-1])
+    if rows and position is not None and (has_more or not backwards):
+        previous_cursor = encode_cursor(CURSOR_PREVIOUS, rows[0])
+    page.next_cursor = lambda: next_cursor
+    page.previous_cursor = lambda: previous_cursor
+    return page
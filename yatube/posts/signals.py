@@ -0,0 +1,150 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from core import edge
+
+from . import cache, counters, search, thumbnails, timelines
+from .models import Comment, Follow, Group, Post, User
+
+
+def _username(instance):
+    try:
+        return instance.author.username
+    except User.DoesNotExist:
+        return None
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        counters.post_created(instance)
+        cache.bump_on_commit(f'author:{instance.author_id}')
+        timelines.fan_out(instance)
+    else:
+        # Before post_changed, which forgets the loaded group.
+        counters.post_moved(
+            instance, getattr(instance, '_loaded_group_id', instance.group_id)
+        )
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.post_deleted(instance)
+    cache.bump_on_commit(f'author:{instance.author_id}')
+
+
+@receiver(post_save, sender=Post)
+def post_indexed(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'text' in update_fields:
+        search.backend().index(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_unindexed(sender, instance, **kwargs):
+    search.backend().remove(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def image_replaced(sender, instance, **kwargs):
+    loaded_image = getattr(instance, '_loaded_image', None)
+    if loaded_image and loaded_image != instance.image.name:
+        thumbnails.release(loaded_image)
+    instance._loaded_image = instance.image.name
+
+
+@receiver(post_delete, sender=Post)
+def image_released(sender, instance, **kwargs):
+    thumbnails.release(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    loaded_group_id = getattr(instance, '_loaded_group_id', None)
+    group_ids = {instance.group_id, loaded_group_id} - {None}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True
+    )
+    cache.bump_on_commit(
+        'feed',
+        f'post:{instance.pk}',
+        f'profile:{_username(instance)}',
+        *(f'group:{slug}' for slug in slugs)
+    )
+    edge.purge(
+        'feed:index',
+        f'post:{instance.pk}',
+        f'author:{instance.author_id}',
+        *(f'group:{slug}' for slug in slugs)
+    )
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.comment_created(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.comment_deleted(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    cache.bump_on_commit(f'post:{instance.post_id}')
+    edge.purge(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    slugs = {instance.slug, getattr(instance, '_loaded_slug', None)}
+    cache.bump_on_commit(
+        'groups', *(f'group:{slug}' for slug in slugs - {None})
+    )
+    edge.purge(*(f'group:{slug}' for slug in slugs - {None}))
+    instance._loaded_slug = instance.slug
+
+
+def _shown(user):
+    # Deferred fields are left out: they are not saved either.
+    return {
+        field: user.__dict__.get(field)
+        for field in ('username', 'first_name', 'last_name', 'is_superuser')
+    }
+
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    """Remembers the loaded names to refresh pages after their change."""
+    instance._loaded_shown = _shown(instance)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, **kwargs):
+    shown = _shown(instance)
+    if not created and shown != getattr(instance, '_loaded_shown', None):
+        cache.bump_on_commit('users')
+        edge.purge(f'author:{instance.pk}')
+    instance._loaded_shown = shown
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.follow_created(instance)
+        timelines.followed(instance.author_id)
+        timelines.backfill(instance.user_id, instance.author_id)
+        cache.bump_on_commit(f'profile:{_username(instance)}')
+        edge.purge(f'author:{instance.author_id}')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.follow_deleted(instance)
+    timelines.purge(instance.user_id, instance.author_id)
+    cache.bump_on_commit(f'profile:{_username(instance)}')
+    edge.purge(f'author:{instance.author_id}')
@@ -0,0 +1,116 @@
+"""
+Russian stemmer (the Snowball algorithm).
+
+See https://snowballstem.org/algorithms/russian/stemmer.html.
+Words in other alphabets are returned unchanged.
+"""
+import re
+from functools import lru_cache
+
+
+VOWELS = 'аеиоуыэюя'
+CYRILLIC = re.compile('^[а-я]+$')
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+REFLEXIVE = ((), ('ся', 'сь'))
+ADJECTIVE = ((), (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+VERB = (
+    (
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+        'ет', 'ют', 'ны', 'ть', 'ешь', 'нно',
+    ),
+    (
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+        'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+        'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+    ),
+)
+NOUN = ((), (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+))
+SUPERLATIVE = ((), ('ейш', 'ейше'))
+DERIVATIONAL = ((), ('ост', 'ость'))
+
+
+def _regions(word):
+    """Returns starts of RV and R2 regions."""
+    rv = r1 = r2 = len(word)
+    for i, letter in enumerate(word):
+        if letter in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _remove(word, start, endings):
+    """
+    Removes the longest of the endings found after start.
+    Endings of the first group must follow "а" or "я".
+    Returns (word, removed).
+    """
+    following, free = endings
+    for ending in sorted(following + free, key=len, reverse=True):
+        if not word.endswith(ending) or len(word) - len(ending) < start:
+            continue
+        if ending in free:
+            return word[:-len(ending)], True
+        before = len(word) - len(ending) - 1
+        if before >= start and word[before] in 'ая':
+            return word[:-len(ending)], True
+        return word, False
+    return word, False
+
+
+@lru_cache(maxsize=2 ** 16)
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC.match(word):
+        return word
+    rv, r2 = _regions(word)
+    # Step 1
+    word, removed = _remove(word, rv, PERFECTIVE_GERUND)
+    if not removed:
+        word, _ = _remove(word, rv, REFLEXIVE)
+        word, removed = _remove(word, rv, ADJECTIVE)
+        if removed:
+            word, _ = _remove(word, rv, PARTICIPLE)
+        else:
+            word, removed = _remove(word, rv, VERB)
+            if not removed:
+                word, _ = _remove(word, rv, NOUN)
+    # Step 2
+    word, _ = _remove(word, rv, ((), ('и',)))
+    # Step 3
+    word, _ = _remove(word, r2, DERIVATIONAL)
+    # Step 4
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    word, removed = _remove(word, rv, SUPERLATIVE)
+    if removed:
+        if word.endswith('нн') and len(word) - 2 >= rv:
+            word = word[:-1]
+        return word
+    word, _ = _remove(word, rv, ((), ('ь',)))
+    return word
@@ -0,0 +1,34 @@
+"""
+Content-addressed storage of post's images.
+
+A file is named after the SHA-256 of its content, so the same picture
+uploaded by many users is stored once and shares its thumbnails.
+Posts refer to the file by name; posts.thumbnails.release() deletes
+the file and its thumbnails after the last post referring to it is gone
+(see posts.signals). An upload of a stored picture writes the file again:
+a release running meanwhile may have just deleted it.
+"""
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores files as <upload_to>/<aa>/<sha256><ext>."""
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, base = os.path.split(name)
+        extension = os.path.splitext(base)[1].lower()
+        name = os.path.join(directory, digest[:2], digest + extension)
+        # Written aside and renamed: readers never see a partial file.
+        temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
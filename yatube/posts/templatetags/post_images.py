@@ -0,0 +1,59 @@
+from django import template
+from django.conf import settings
+from sorl.thumbnail import default
+from sorl.thumbnail.images import DummyImageFile
+
+from ..thumbnails import CONTENT_TYPES, configured_renditions
+
+
+register = template.Library()
+
+
+def _srcset(thumbnails):
+    return ', '.join(
+        f'{thumbnail.url} {width}w' for thumbnail, width in thumbnails
+    )
+
+
+def _thumbnail(image, geometry, options, make):
+    if make:
+        return default.backend.get_thumbnail(image, geometry, **options)
+    return default.backend.lookup(image, geometry, **options)
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(image):
+    """
+    Renders <picture> of the image's renditions: a <source> per format,
+    the last format is the <img> fallback. Renditions being made are
+    skipped; a placeholder is shown until the fallback has any.
+    Without THUMBNAIL_WORKERS only the widest fallback is made on the
+    request, the others are shown once they are made on upload.
+    """
+    width, height = settings.POST_IMAGE_SIZE.split('x')
+    context = {'image': image, 'width': width, 'height': height}
+    if not image:
+        return context
+    formats = {}
+    renditions = configured_renditions()
+    for geometry, options in renditions:
+        ready = formats.setdefault(options['format'], [])
+        thumbnail = _thumbnail(
+            image, geometry, options,
+            settings.THUMBNAIL_WORKERS or (geometry, options) == renditions[-1]
+        )
+        if thumbnail and not isinstance(thumbnail, DummyImageFile):
+            ready.append((thumbnail, geometry.split('x')[0]))
+    if not formats:
+        return context
+    fallback = formats.pop(list(formats)[-1])
+    if fallback:
+        context.update(
+            fallback=fallback[-1][0],
+            srcset=_srcset(fallback),
+            sources=[
+                {'type': CONTENT_TYPES[name], 'srcset': _srcset(thumbnails)}
+                for name, thumbnails in formats.items() if thumbnails
+            ],
+        )
+    return context
@@ -1,12 +1,15 @@
+import hashlib
 import os
 import shutil
 import tempfile
 from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import Client, override_settings, TestCase
 from django.urls import reverse
 
+from .. import thumbnails
 from ..models import Group, Post
 
 
@@ -163,6 +166,10 @@ IMAGE = (
     b'\x0A\x00\x3B'
 )
 
+# Name of IMAGE in the content-addressed storage.
+IMAGE_DIGEST = hashlib.sha256(IMAGE).hexdigest()
+IMAGE_NAME = f'posts/{IMAGE_DIGEST[:2]}/{IMAGE_DIGEST}.gif'
+
 User = get_user_model()
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(
@@ -170,6 +177,13 @@ TEMP_MEDIA_ROOT = tempfile.mkdtemp(
 )
 
 
+def query_plan(sql):
+    """Returns steps of SQLite's plan of the query."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
 class TestConfig(TestCase):
     @classmethod
     @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -190,6 +204,8 @@ class TestConfig(TestCase):
     @classmethod
     def tearDownClass(cls):
         super().tearDownClass()
+        # Workers must not outlive the media directory.
+        thumbnails.shutdown()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .conf import User
+from ..models import Group, Post
+from ..utils import EstimatedCountPaginator, estimate_count
+
+
+class PostAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:posts_post_changelist')
+
+    def add_posts(self, amount, text='Запись'):
+        for _ in range(amount):
+            number = Post.objects.count()
+            author = User.objects.create_user(f'author-{number}')
+            group = Group.objects.create(
+                title=f'group-{number}', slug=f'group-{number}'
+            )
+            Post.objects.create(text=text, author=author, group=group)
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        return [query['sql'] for query in context.captured_queries]
+
+    def test_queries_do_not_grow(self):
+        """Authors and groups are joined, groups aren't listed per row."""
+        self.add_posts(2)
+        few = self.changelist_queries()
+        self.add_posts(4)
+        self.assertEqual(len(self.changelist_queries()), len(few))
+        self.assertFalse(
+            [sql for sql in few if 'FROM "posts_group"' in sql]
+        )
+
+    def test_search_uses_index(self):
+        """Search finds other word's forms through the full-text index."""
+        self.add_posts(1, 'Важная публикация')
+        self.add_posts(1, 'Другое')
+        response = self.client.get(self.url, {'q': 'публикации'})
+        self.assertEqual(
+            [post.text for post in response.context['cl'].result_list],
+            ['Важная публикация']
+        )
+
+    def test_estimated_count(self):
+        """Unfiltered list is counted from the statistics."""
+        self.add_posts(3)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(estimate_count(Post), 3)
+        with mock.patch.object(EstimatedCountPaginator, 'COUNT_LIMIT', 1):
+            paginator = EstimatedCountPaginator(Post.objects.all(), 10)
+            self.assertEqual(paginator.count, 3)
+            paginator = EstimatedCountPaginator(
+                Post.objects.filter(text='Запись'), 10
+            )
+            self.assertEqual(paginator.count, 1)
+
+    def test_change_form(self):
+        """Post's form shows author and group with autocomplete."""
+        self.add_posts(1)
+        post = Post.objects.get()
+        response = self.client.get(
+            reverse('admin:posts_post_change', args=(post.pk,))
+        )
+        self.assertContains(response, 'class="admin-autocomplete', count=2)
+        self.assertContains(response, post.group.title)
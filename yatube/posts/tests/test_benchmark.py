@@ -0,0 +1,83 @@
+from django.core.cache import cache
+from django.db.models import Count
+from django.test import override_settings, TestCase
+
+from .. import benchmark
+from ..models import AuthorStat, Follow, Group, Post, TimelineEntry, User
+
+
+@override_settings(FOLLOW_TIMELINE_SIZE=5, FOLLOW_FANOUT_LIMIT=3)
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        benchmark.seed(users=30, posts=300, groups=3, follows=3)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_seed(self):
+        """Generated data is skewed and all derived data is built."""
+        self.assertEqual(
+            (User.objects.count(), Group.objects.count(),
+             Post.objects.count()),
+            (30, 3, 300)
+        )
+        posts = Post.objects.values('author').annotate(
+            total=Count('pk')
+        ).order_by('-total')
+        self.assertGreater(posts[0]['total'], 3 * 300 / 30)
+        self.assertEqual(
+            AuthorStat.objects.get(author=posts[0]['author']).posts_count,
+            posts[0]['total']
+        )
+        self.assertTrue(Follow.objects.exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertFalse(TimelineEntry.objects.filter(
+            post__author__stat__followers_count__gt=3
+        ).exists())
+        self.assertFalse(TimelineEntry.objects.values('user').annotate(
+            total=Count('pk')
+        ).filter(total__gt=5).exists())
+
+    def test_measure(self):
+        """Every page which doesn't write is measured."""
+        report = benchmark.measure(requests=2)
+        self.assertEqual(set(report), {
+            'index', 'group_list', 'profile', 'post_detail', 'post_edit',
+            'post_create', 'follow_index', 'search',
+        })
+        for name, result in report.items():
+            with self.subTest(name=name):
+                self.assertGreater(result['queries'], 0)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertEqual(benchmark.compare(report, report), [])
+        baseline = {'index': {**report['index'], 'queries': 0}}
+        self.assertEqual(
+            benchmark.compare(report, baseline),
+            [f'index: queries {report["index"]["queries"]} > 0']
+        )
+
+    def test_relative_latency(self):
+        """A slower machine isn't a regression, a slower page is."""
+        baseline = {
+            'index': {'queries': 1, 'p50_ms': 10, 'p99_ms': 20,
+                      'peak_kib': 100},
+            'profile': {'queries': 1, 'p50_ms': 20, 'p99_ms': 40,
+                        'peak_kib': 100},
+            'search': {'queries': 1, 'p50_ms': 30, 'p99_ms': 60,
+                       'peak_kib': 100},
+        }
+        slower = {
+            name: {**result, 'p50_ms': result['p50_ms'] * 3,
+                   'p99_ms': result['p99_ms'] * 3}
+            for name, result in baseline.items()
+        }
+        self.assertNotEqual(benchmark.compare(slower, baseline), [])
+        self.assertEqual(
+            benchmark.compare(slower, baseline, relative=True), []
+        )
+        slower['search'] = {**slower['search'], 'p50_ms': 30 * 3 * 3}
+        self.assertEqual(
+            benchmark.compare(slower, baseline, relative=True),
+            ['search: p50_ms 270 > 30']
+        )
@@ -0,0 +1,243 @@
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import bulk, search
+from ..models import AuthorStat, Comment, Follow, Group, Post, User
+
+PUB_DATE = datetime(2020, 5, 17, 12, 30, tzinfo=timezone.utc)
+
+
+def indexes():
+    with connection.cursor() as cursor:
+        return {
+            name
+            for model in (Post, Comment, Follow)
+            for name in connection.introspection.get_constraints(
+                cursor, model._meta.db_table
+            )
+        }
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write_jsonl(self, name, rows, opener=open):
+        path = os.path.join(self.directory, name)
+        with opener(path, 'wt', encoding='utf-8') as file:
+            for row in rows:
+                file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        return path
+
+    def write_csv(self, name, rows):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def test_import(self):
+        """Rows of every model are loaded with their data rebuilt."""
+        users = self.write_jsonl('users.jsonl.gz', [
+            {'id': 10, 'username': 'author'},
+            {'id': 11, 'username': 'reader'},
+        ], opener=gzip.open)
+        groups = self.write_csv('groups.csv', [
+            {'id': 5, 'title': 'Группа', 'slug': 'group', 'description': ''},
+        ])
+        posts = self.write_jsonl('posts.jsonl', [
+            {'id': 7, 'text': 'Первая публикация', 'author_id': 10,
+             'group_id': 5, 'pub_date': PUB_DATE.isoformat()},
+            {'id': 8, 'text': 'Вторая', 'author': 10, 'group': None},
+        ])
+        comments = self.write_csv('comments.csv', [
+            {'post': 7, 'author': 11, 'text': 'Комментарий',
+             'created': PUB_DATE.isoformat()},
+        ])
+        follows = self.write_csv('follows.csv', [{'user': 11, 'author': 10}])
+        before = indexes()
+        out = StringIO()
+        call_command(
+            'import_posts', users=users, groups=groups, posts=posts,
+            comments=comments, follows=follows, batch_size=1, stdout=out
+        )
+        self.assertIn('posts: 2 rows', out.getvalue())
+        self.assertEqual(indexes(), before)
+        post = Post.objects.get(pk=7)
+        self.assertEqual(
+            (post.author.username, post.group.slug, post.pub_date,
+             post.comments_count),
+            ('author', 'group', PUB_DATE, 1)
+        )
+        self.assertIsNotNone(Post.objects.get(pk=8).pub_date)
+        self.assertEqual(Comment.objects.get().created, PUB_DATE)
+        self.assertEqual(Group.objects.get().posts_count, 1)
+        self.assertEqual(AuthorStat.objects.get(author_id=10).posts_count, 2)
+        self.assertEqual(
+            set(User.objects.get(pk=11).timeline.values_list(
+                'post', flat=True
+            )),
+            {7, 8}
+        )
+        self.assertEqual(
+            [pk for _, pk in search.backend().search('публикации')], [7]
+        )
+        self.assertEqual(Follow.objects.get().author_id, 10)
+        new = Post.objects.create(text='новая', author_id=10)
+        self.assertGreater(new.pk, 8)
+
+    def test_errors(self):
+        """Broken files fail the command and leave indexes in place."""
+        before = indexes()
+        wrong = (
+            self.write_jsonl('posts.json', []),
+            self.write_jsonl('posts.jsonl', [{'title': 'нет поля'}]),
+            self.write_jsonl('ids.jsonl', [{'id': 'x'}]),
+            os.path.join(self.directory, 'missing.csv'),
+        )
+        for path in wrong:
+            with self.subTest(path=path):
+                with self.assertRaises(CommandError):
+                    call_command('import_posts', posts=path, stdout=StringIO())
+                self.assertEqual(indexes(), before)
+        with self.assertRaises(CommandError):
+            call_command('import_posts', stdout=StringIO())
+
+    def test_missing_relations(self):
+        """Rows referring to missing objects load nothing."""
+        User.objects.create_user('author')
+        wrong = (
+            [{'id': 1, 'text': 'есть', 'author': 'author'},
+             {'id': 2, 'text': 'нет автора', 'author_id': 404}],
+            [{'id': 1, 'text': 'есть', 'author': 'author'},
+             {'id': 2, 'text': 'нет группы', 'author': 'author',
+              'group': 'missing'}],
+        )
+        for rows in wrong:
+            with self.subTest(rows=rows):
+                path = self.write_jsonl('posts.jsonl', rows)
+                with self.assertRaises(CommandError):
+                    call_command(
+                        'import_posts', posts=path, batch_size=1,
+                        stdout=StringIO()
+                    )
+                self.assertFalse(Post.objects.exists())
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        group = Group.objects.create(title='Группа', slug='group')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {number}', author=cls.author,
+                group=group if number % 2 else None
+            )
+            for number in range(5)
+        ]
+        for number in range(2):
+            Comment.objects.create(
+                post=cls.posts[1], author=cls.author, text=f'{number}'
+            )
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.output = os.path.join(self.directory, 'posts.jsonl.gz')
+
+    def exported(self, **options):
+        call_command('export_posts', self.output, stdout=StringIO(),
+                     **options)
+        with gzip.open(self.output, 'rt', encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_export(self):
+        """Posts are written in order with author, group and comments."""
+        rows = self.exported()
+        self.assertEqual(
+            [row['id'] for row in rows], [post.pk for post in self.posts]
+        )
+        row = rows[1]
+        self.assertEqual(
+            (row['text'], row['author'], row['group']),
+            ('Пост 1', 'author', 'group')
+        )
+        self.assertEqual(
+            [comment['text'] for comment in row['comments']], ['0', '1']
+        )
+        self.assertEqual((rows[0]['group'], rows[0]['comments']), (None, []))
+
+    def test_chunks(self):
+        """Posts are fetched by chunks, comments by a query per chunk."""
+        with self.assertNumQueries(4):
+            rows = list(bulk.export(Post.objects.all(), chunk_size=2))
+        self.assertEqual(len(rows), 5)
+
+    def test_watermark(self):
+        """Next export continues after the last exported post."""
+        watermark = os.path.join(self.directory, 'watermark.json')
+        self.assertEqual(len(self.exported(watermark=watermark)), 5)
+        self.assertEqual(self.exported(watermark=watermark), [])
+        post = Post.objects.create(text='Новый', author=self.author)
+        self.assertEqual(
+            [row['id'] for row in self.exported(watermark=watermark)],
+            [post.pk]
+        )
+        since = self.posts[2]
+        rows = self.exported(
+            since=since.pub_date.isoformat(), since_id=since.pk
+        )
+        self.assertEqual(rows[0]['id'], self.posts[3].pk)
+        with self.assertRaises(CommandError):
+            self.exported(since='вчера')
+
+    def test_import_exported(self):
+        """Exported posts are imported back with their comments."""
+        exported = self.exported()
+        Post.objects.all().delete()
+        call_command(
+            'import_posts', posts=self.output, batch_size=2,
+            stdout=StringIO()
+        )
+        self.assertEqual(self.exported(), exported)
+        post = Post.objects.get(pk=self.posts[1].pk)
+        self.assertEqual(
+            (post.author, post.group.slug, post.comments_count),
+            (self.author, 'group', 2)
+        )
+
+    def test_admin_action(self):
+        """Admin streams selected posts."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        response = self.client.post(
+            reverse('admin:posts_post_changelist'),
+            {
+                'action': 'export',
+                '_selected_action': [self.posts[0].pk, self.posts[3].pk],
+            }
+        )
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(
+            b''.join(response.streaming_content)
+        ).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line)['id'] for line in lines],
+            [self.posts[0].pk, self.posts[3].pk]
+        )
@@ -1,12 +1,16 @@
 import shutil
 import tempfile
+from io import BytesIO
+from unittest import mock
 
 from django.conf import settings
+from django.db import transaction
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import override_settings
 from django.urls import reverse
+from PIL import Image
 
-from .conf import IMAGE, TestConfig
+from .conf import IMAGE, IMAGE_NAME, TestConfig
 from ..forms import PostForm
 from ..models import Group, Post
 
@@ -14,6 +18,12 @@ from ..models import Group, Post
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
+def jpeg(size, exif=b''):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
 class PostFormTests(TestConfig):
     @classmethod
     def setUpClass(cls):
@@ -65,7 +75,7 @@ class PostFormTests(TestConfig):
                 text=form_data['text'],
                 author__username=user,
                 group=PostFormTests.group.id,
-                image='posts/small.gif'
+                image=IMAGE_NAME
             ).exists()
         )
 
@@ -99,3 +109,113 @@ class PostFormTests(TestConfig):
                 group__isnull=True
             ).exists()
         )
+
+    @override_settings(
+        MEDIA_ROOT=TEMP_MEDIA_ROOT, FILE_UPLOAD_MAX_MEMORY_SIZE=0
+    )
+    def test_image_limits(self):
+        """Too large images are rejected before decoding."""
+        cases = {
+            'too_large': {'POST_IMAGE_MAX_BYTES': len(IMAGE) - 1},
+            'too_many_pixels': {'POST_IMAGE_MAX_PIXELS': 1},
+        }
+        posts_count = Post.objects.count()
+        for code, limits in cases.items():
+            with self.subTest(code=code), self.settings(**limits):
+                uploaded = SimpleUploadedFile(
+                    name='small.gif', content=IMAGE, content_type='image/gif'
+                )
+                response = self.clients['authorized'].post(
+                    reverse('posts:post_create'),
+                    data={'text': 'Большая картинка', 'image': uploaded}
+                )
+                self.assertEqual(
+                    response.context['form'].errors.as_data()['image'][0]
+                    .code,
+                    code
+                )
+        self.assertEqual(Post.objects.count(), posts_count)
+
+    @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, POST_IMAGE_MAX_SIDE=40)
+    def test_image_is_normalized(self):
+        """Uploaded image is rotated, downsampled and has no EXIF."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Camera'
+        uploaded = SimpleUploadedFile(
+            name='photo.jpg',
+            content=jpeg((100, 50), exif.tobytes()),
+            content_type='image/jpeg'
+        )
+        self.clients['authorized'].post(
+            reverse('posts:post_create'),
+            data={'text': 'Фотография', 'image': uploaded}
+        )
+        post = Post.objects.get(text='Фотография')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (20, 40))
+            self.assertEqual(len(image.getexif()), 0)
+
+    @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+    def test_image_deduplication(self):
+        """Same image is stored once and deleted with its last post."""
+        storage = Post._meta.get_field('image').storage
+        callbacks = []
+        with mock.patch.object(transaction, 'on_commit', callbacks.append):
+            for client in ('authorized', 'author'):
+                uploaded = SimpleUploadedFile(
+                    name=f'{client}.gif', content=IMAGE,
+                    content_type='image/gif'
+                )
+                self.clients[client].post(
+                    reverse('posts:post_create'),
+                    data={'text': client, 'image': uploaded}
+                )
+                post = Post.objects.get(text=client)
+                self.assertEqual(post.image.name, IMAGE_NAME)
+            for client, exists in (('authorized', True), ('author', False)):
+                with self.subTest(client=client):
+                    callbacks.clear()
+                    post = Post.objects.get(text=client)
+                    self.clients[client].get(
+                        reverse('posts:delete_post', args=(post.pk,))
+                    )
+                    for callback in callbacks:
+                        callback()
+                    self.assertEqual(storage.exists(IMAGE_NAME), exists)
+
+    @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+    def test_image_release(self):
+        """
+        Upload writes a stored image again, cascade and bulk deletes
+        release it as views do.
+        """
+        storage = Post._meta.get_field('image').storage
+        callbacks = []
+        with mock.patch.object(transaction, 'on_commit', callbacks.append):
+            for client in ('authorized', 'author'):
+                uploaded = SimpleUploadedFile(
+                    name=f'{client}.gif', content=IMAGE,
+                    content_type='image/gif'
+                )
+                # Found, then deleted by a release of another post.
+                storage.delete(IMAGE_NAME)
+                with mock.patch.object(
+                    storage, 'exists', lambda name: name == IMAGE_NAME
+                ):
+                    self.clients[client].post(
+                        reverse('posts:post_create'),
+                        data={'text': client, 'image': uploaded}
+                    )
+                self.assertTrue(storage.exists(IMAGE_NAME))
+            deletes = (
+                (self.user.delete, True),
+                (Post.objects.filter(text='author').delete, False),
+            )
+            for delete, exists in deletes:
+                with self.subTest(exists=exists):
+                    callbacks.clear()
+                    delete()
+                    for callback in callbacks:
+                        callback()
+                    self.assertEqual(storage.exists(IMAGE_NAME), exists)
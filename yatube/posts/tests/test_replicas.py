@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, override_settings, TestCase
+from django.urls import reverse
+
+from core.replicas import PIN_COOKIE
+from .conf import User
+from .. import cache as cache_module
+from ..models import Follow, Group, Post
+
+REPLICA = 'replica'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaTests(TestCase):
+    """
+    The replica is another SQLite file, not synced with the primary:
+    a page shows the rows of the database it was read from.
+    """
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.databases[REPLICA] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+            'TEST': {'MIRROR': None},
+        }
+        call_command('migrate', database=REPLICA, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        shutil.rmtree(cls.directory)
+
+    @classmethod
+    def setUpTestData(cls):
+        # Same rows in both databases, as replicated, but post's text.
+        for database in ('default', REPLICA):
+            User.objects.using(database).bulk_create([
+                User(pk=1, username='author'), User(pk=2, username='reader')
+            ])
+            Group.objects.using(database).bulk_create([
+                Group(pk=1, title='group', slug='group')
+            ])
+            Post.objects.using(database).bulk_create([Post(
+                pk=1, text=f'from {database}', author_id=1, group_id=1
+            )])
+        cls.user = User.objects.get(pk=2)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(ReplicaTests.user)
+
+    @override_settings(REPLICA_PIN_SECONDS=0)
+    def test_reads_from_replica(self):
+        """Feeds and post's page are read from the replica."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': 1}),
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                response = Client().get(page)
+                self.assertContains(response, f'from {REPLICA}')
+                self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_read_your_writes(self):
+        """After a write the client reads from the primary."""
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'fresh post'}
+        )
+        self.assertIn(PIN_COOKIE, response.cookies)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'fresh post')
+        self.assertContains(response, 'from default')
+        self.client.cookies.pop(PIN_COOKIE)
+        for client in (self.client, Client()):
+            with self.subTest(authenticated=client is self.client):
+                response = client.get(reverse('posts:index'))
+                self.assertContains(response, 'fresh post')
+                self.assertContains(response, 'from default')
+
+    def test_primary_after_change(self):
+        """Pages of data changed lately are read from the primary."""
+        cache_module.bump('post:1')
+        url = reverse('posts:post_detail', kwargs={'post_id': 1})
+        self.assertContains(Client().get(url), 'from default')
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            cache_module.bump('post:1')
+            self.assertContains(Client().get(url), f'from {REPLICA}')
+
+    def test_writes_go_to_primary(self):
+        """Follows and comments are saved in the primary."""
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': 1}),
+            {'text': 'comment'}
+        )
+        self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'author'})
+        )
+        for database, count in (('default', 1), (REPLICA, 0)):
+            with self.subTest(database=database):
+                post = Post.objects.using(database).get(pk=1)
+                self.assertEqual(post.comments.count(), count)
+                self.assertEqual(
+                    Follow.objects.using(database).count(), count
+                )
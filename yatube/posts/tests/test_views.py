@@ -1,18 +1,36 @@
+import threading
+from concurrent.futures import Future
+from io import StringIO
+from unittest import mock
+
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, OperationalError, transaction
 from django.test import Client, override_settings, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from core import edge
+from core.tests.fake_edge import FakeEdgeServer
 from .conf import (
-    IMAGE, PAGES_CREATE_OR_COMMENT, PAGES_WITH_POST, TEMP_MEDIA_ROOT,
-    TEST_POSTS_AMOUNT, TEST_VIEW_TMPLT, TestConfig, USER_STATUS
+    IMAGE, IMAGE_NAME, PAGES_CREATE_OR_COMMENT, PAGES_WITH_POST,
+    TEMP_MEDIA_ROOT, TEST_POSTS_AMOUNT, TEST_VIEW_TMPLT, TestConfig,
+    USER_STATUS, query_plan
 )
+from .. import cache as page_cache, thumbnails
+from ..cache import bump, page_key
+from ..counters import feed_count, recount
 from ..forms import CommentForm, PostForm
-from ..models import Comment, Follow, Group, Post
+from ..models import (
+    AuthorStat, Comment, Follow, Group, Post, TimelineEntry
+)
+from ..search import SearchBackend
+from ..utils import EstimatedCountPaginator, KeysetPaginator
 
 
 User = get_user_model()
@@ -42,12 +60,65 @@ class PostImagesTests(TestConfig):
             else:
                 obj = context['post']
             attrs = {
-                obj.image.name: 'posts/small.gif'
+                obj.image.name: IMAGE_NAME
             }
             for attr, value in attrs.items():
                 with self.subTest(attr=attr, reverse_name=reverse_name):
                     self.assertEqual(attr, value)
 
+    @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=2)
+    def test_deferred_thumbnail(self):
+        """Placeholder is shown until the thumbnail is made."""
+        cache.clear()
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        response = self.clients['unauthorized'].get(url)
+        self.assertNotContains(response, '<img class="card-img')
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+        thumbnails.generate(self.post.image.name)
+        response = self.clients['unauthorized'].get(url)
+        self.assertContains(response, '<img class="card-img')
+        for width in settings.POST_IMAGE_WIDTHS:
+            with self.subTest(width=width):
+                self.assertContains(response, f' {width}w')
+
+    @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+    def test_thumbnail_on_request(self):
+        """Without workers only the widest fallback is made on request."""
+        cache.clear()
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        response = self.clients['unauthorized'].get(url)
+        widths = settings.POST_IMAGE_WIDTHS
+        self.assertContains(response, '<img class="card-img')
+        self.assertContains(response, f' {widths[-1]}w')
+        self.assertNotContains(response, f' {widths[0]}w')
+        self.assertNotContains(response, '<source')
+        thumbnails.generate(self.post.image.name)
+        response = self.clients['unauthorized'].get(url)
+        self.assertContains(response, f' {widths[0]}w')
+
+    @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+    def test_thumbnails_on_upload(self):
+        """Thumbnails are made when the form saves an image."""
+        cache.clear()
+        uploaded = SimpleUploadedFile(
+            name='upload.gif', content=IMAGE, content_type='image/gif'
+        )
+        callbacks = []
+        with mock.patch.object(
+            thumbnails.transaction, 'on_commit', callbacks.append
+        ):
+            self.clients['author'].post(
+                reverse('posts:post_create'),
+                data={'text': 'with image', 'image': uploaded}
+            )
+        for callback in callbacks:
+            callback()
+        post = Post.objects.get(text='with image')
+        geometry, options = thumbnails.configured_renditions()[0]
+        self.assertIsNotNone(
+            thumbnails.default.backend.lookup(post.image, geometry, **options)
+        )
+
 
 class PostPagesTests(TestConfig):
     def test_pages_uses_correct_template(self):
@@ -145,15 +216,178 @@ class PostPagesTests(TestConfig):
                     )
 
     def test_cache(self):
-        """Cache's testing."""
+        """Cache's testing: page is kept until its data is changed."""
+        cache.clear()
         response = self.clients['authorized'].get(reverse('posts:index'))
-        old_page, old_posts_count = response.content, Post.objects.count()
-        PostPagesTests.post.delete()
+        old_page = response.content
+        Post.objects.filter(pk=PostPagesTests.post.pk).update(text='hidden')
         response = self.clients['authorized'].get(reverse('posts:index'))
-        new_page, new_posts_count = response.content, Post.objects.count()
-        with self.subTest():
-            self.assertEqual(old_page, new_page)
-            self.assertNotEqual(old_posts_count, new_posts_count)
+        self.assertEqual(old_page, response.content)
+        Post.objects.get(pk=PostPagesTests.post.pk).delete()
+        response = self.clients['authorized'].get(reverse('posts:index'))
+        self.assertNotEqual(old_page, response.content)
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_cache_invalidation(self):
+        """Changes of posts, comments and follows refresh cached pages."""
+        post = Post.objects.get(pk=PostPagesTests.post.pk)
+
+        def new_post():
+            Post.objects.create(text='index', author=self.user)
+
+        def edit_group():
+            Group.objects.get(pk=post.group_id).save()
+
+        def follow():
+            Follow.objects.create(user=self.user, author=self.post_author)
+
+        def comment():
+            Comment.objects.create(post=post, author=self.user, text='text')
+
+        pages = {
+            reverse('posts:index'): new_post,
+            reverse('posts:group_list', kwargs={'slug': 'test-group'}):
+                edit_group,
+            reverse('posts:profile', kwargs={'username': 'test_author'}):
+                follow,
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}):
+                comment,
+        }
+        cache.clear()
+        for page, change in pages.items():
+            with self.subTest(page=page):
+                client = self.clients['unauthorized']
+                self.assertIsNotNone(client.get(page).context)
+                self.assertIsNone(client.get(page).context)
+                change()
+                self.assertIsNotNone(client.get(page).context)
+
+    def test_invalidation_after_commit(self):
+        """Pages cached before the change is committed are refreshed."""
+        page = reverse('posts:index')
+        client = self.clients['unauthorized']
+        callbacks = []
+        with mock.patch.object(transaction, 'on_commit', callbacks.append):
+            Post.objects.create(text='index', author=self.user)
+        self.assertIsNotNone(client.get(page).context)
+        self.assertIsNone(client.get(page).context)
+        for callback in callbacks:
+            callback()
+        self.assertIsNotNone(client.get(page).context)
+
+    def test_shared_fragments(self):
+        """Users share cached post cards but get their own header."""
+        cache.clear()
+        self.clients['authorized'].get(reverse('posts:index'))
+        Post.objects.filter(pk=PostPagesTests.post.pk).update(text='hidden')
+        response = self.clients['author'].get(reverse('posts:index'))
+        self.assertIsNotNone(response.context)
+        self.assertContains(response, PostPagesTests.post.text)
+        self.assertNotContains(response, 'hidden')
+        self.assertContains(response, self.post_author.username)
+
+    def test_post_card_cache(self):
+        """Post's card is cached until the post is edited."""
+        cache.clear()
+        self.guest_client.get(reverse('posts:index'))
+        Post.objects.filter(pk=PostPagesTests.post.pk).update(text='hidden')
+        bump('feed')
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'hidden')
+        self.author.post(
+            reverse('posts:post_edit', kwargs={'post_id': 1}),
+            {'text': 'edited'}
+        )
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, 'edited')
+
+    def test_renames(self):
+        """Renamed authors and groups are shown on cached pages."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-group'}),
+            reverse('posts:profile', kwargs={'username': 'test_author'}),
+            reverse('posts:post_detail', kwargs={'post_id': 1}),
+        )
+        cache.clear()
+        for page in pages:
+            self.guest_client.get(page)
+        self.post_author.first_name = 'Переименованный'
+        self.post_author.save()
+        group = Group.objects.get(slug='test-group')
+        group.title = 'Переименованная'
+        group.save()
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.guest_client.get(page)
+                self.assertContains(response, 'Переименованный')
+                self.assertContains(response, 'Переименованная')
+
+    def test_unshown_user_changes(self):
+        """Saving a user without changing the names keeps cached pages."""
+        page = reverse('posts:index')
+        cache.clear()
+        self.guest_client.get(page)
+        author = User.objects.get(pk=self.post_author.pk)
+        author.set_password('new-password')
+        author.save()
+        author.username = author.username
+        author.save()
+        self.assertIsNone(self.guest_client.get(page).context)
+        author.last_name = 'Переименованный'
+        author.save()
+        self.assertIsNotNone(self.guest_client.get(page).context)
+
+    def test_author_post_count(self):
+        """Cached post's page shows the author's new post count."""
+        page = reverse('posts:post_detail', kwargs={'post_id': 1})
+        cache.clear()
+        self.assertContains(
+            self.guest_client.get(page), 'Всего постов автора:  <span>1<'
+        )
+        post = Post.objects.create(text='new', author=self.post_author)
+        self.assertContains(
+            self.guest_client.get(page), 'Всего постов автора:  <span>2<'
+        )
+        post.delete()
+        self.assertContains(
+            self.guest_client.get(page), 'Всего постов автора:  <span>1<'
+        )
+
+    def test_conditional_get(self):
+        """Unchanged pages are revalidated with 304 Not Modified."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test-group'}),
+            reverse('posts:profile', kwargs={'username': 'test_author'}),
+            reverse('posts:post_detail', kwargs={'post_id': 1}),
+        )
+        cache.clear()
+        for page in pages:
+            for client, (control, queries) in (
+                (self.guest_client, ('public', 0)),
+                (self.authorized_client, ('private', 2)),
+            ):
+                with self.subTest(page=page, control=control):
+                    response = client.get(page)
+                    etag = response['ETag']
+                    self.assertTrue(etag.startswith('W/'))
+                    self.assertIn(control, response['Cache-Control'])
+                    self.assertIn('max-age=0', response['Cache-Control'])
+                    self.assertIn('Cookie', response['Vary'])
+                    self.assertFalse(response.has_header('Expires'))
+                    with self.assertNumQueries(queries):
+                        response = client.get(page, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code, 304)
+                    self.assertIn(control, response['Cache-Control'])
+        etag = self.guest_client.get(pages[-1])['ETag']
+        self.assertEqual(
+            self.author.get(pages[-1], HTTP_IF_NONE_MATCH=etag).status_code,
+            200
+        )
+        Comment.objects.create(post_id=1, author=self.user, text='text')
+        response = self.guest_client.get(pages[-1], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
 
     def test_unauthorized_cannot_create_comment(self):
         """Test anonymous user can not create comment."""
@@ -204,6 +438,303 @@ class PaginatorViewsTest(TestCase):
                         TEST_POSTS_AMOUNT % settings.SHOWN_POSTS_COUNT
                     )
 
+    def test_cursor_pages(self):
+        """Cursor paginator's testing: forward and backward."""
+        cache.clear()
+        reverse_name = reverse('posts:index')
+        first = self.guest.get(reverse_name).context['page_obj']
+        first_posts = list(first)
+        self.assertEqual(len(first_posts), settings.SHOWN_POSTS_COUNT)
+        self.assertIsNone(first.previous_cursor())
+        cache.clear()
+        second = self.guest.get(
+            reverse_name, {'cursor': first.next_cursor()}
+        ).context['page_obj']
+        self.assertEqual(
+            len(second),
+            TEST_POSTS_AMOUNT % settings.SHOWN_POSTS_COUNT
+        )
+        self.assertIsNone(second.next_cursor())
+        self.assertEqual(
+            set(first_posts) | set(second),
+            set(Post.objects.all())
+        )
+        cache.clear()
+        back = self.guest.get(
+            reverse_name, {'cursor': second.previous_cursor()}
+        ).context['page_obj']
+        self.assertEqual(list(back), first_posts)
+        self.assertIsNone(back.previous_cursor())
+
+    def test_broken_cursor(self):
+        """Broken cursor gives the first page."""
+        cache.clear()
+        response = self.guest.get(reverse('posts:index'), {'cursor': '%%%'})
+        self.assertEqual(
+            len(response.context['page_obj']),
+            settings.SHOWN_POSTS_COUNT
+        )
+
+    def test_elided_page_range(self):
+        """Only a window of pages around the current one is linked."""
+        paginator = KeysetPaginator(
+            Post.objects.all(), 10, count=lambda: 1000
+        )
+        cases = {
+            1: [1, 2, 3, '…', 100],
+            50: [1, '…', 48, 49, 50, 51, 52, '…', 100],
+            99: [1, '…', 97, 98, 99, 100],
+        }
+        for number, pages in cases.items():
+            with self.subTest(number=number):
+                self.assertEqual(
+                    list(paginator.get_page(number).elided_page_range),
+                    pages
+                )
+
+    def test_approximate_count(self):
+        """Numbered pages take the cached total instead of COUNT(*)."""
+        cache.clear()
+        cache.set('feed-count:feed', 1000)
+        with CaptureQueriesContext(connection) as context:
+            response = self.guest.get(reverse('posts:index'), {'page': 2})
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in context.captured_queries
+        ))
+        self.assertEqual(
+            len(response.context['page_obj']),
+            TEST_POSTS_AMOUNT - settings.SHOWN_POSTS_COUNT
+        )
+        self.assertContains(response, '?page=100')
+        self.assertNotContains(response, '?page=50"')
+        # Numbers past the total are clamped to the last page.
+        response = self.guest.get(reverse('posts:index'), {'page': 10 ** 9})
+        self.assertEqual(
+            response.context['page_obj'].number,
+            1000 // settings.SHOWN_POSTS_COUNT
+        )
+
+    @mock.patch.object(EstimatedCountPaginator, 'COUNT_LIMIT', 5)
+    def test_count_without_statistics(self):
+        """Unfiltered tables without statistics are counted exactly."""
+        self.assertEqual(
+            EstimatedCountPaginator(Post.objects.all(), 1).count,
+            TEST_POSTS_AMOUNT
+        )
+        self.assertEqual(
+            EstimatedCountPaginator(
+                Post.objects.filter(author=self.user), 1
+            ).count,
+            5
+        )
+
+    def test_feed_count(self):
+        """Feeds' totals come from the counters and are cached."""
+        cache.clear()
+        recount()
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        feeds = (
+            ('feed',), ('profile', self.user.pk), ('follow', reader.pk)
+        )
+        for feed in feeds:
+            with self.subTest(feed=feed):
+                self.assertEqual(feed_count(*feed), TEST_POSTS_AMOUNT)
+                with self.assertNumQueries(0):
+                    feed_count(*feed)
+
+
+class StaleCacheTests(TestConfig):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_stale_while_revalidate(self):
+        """While another worker renders the page, the stale one is served."""
+        url = reverse('posts:index')
+        old = self.guest_client.get(url)
+        bump('feed')
+        lock = page_key('http://testserver' + url) + ':lock'
+        cache.add(lock, 1)
+        response = self.guest_client.get(url)
+        self.assertIsNone(response.context)
+        self.assertEqual(response.content, old.content)
+        self.assertEqual(response['ETag'], old['ETag'])
+        cache.delete(lock)
+        response = self.guest_client.get(url)
+        self.assertIsNotNone(response.context)
+        self.assertNotEqual(response['ETag'], old['ETag'])
+        self.assertIsNone(self.guest_client.get(url).context)
+
+    def test_database_failure(self):
+        """Stale page is served when the database fails."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        old = self.guest_client.get(url)
+        bump(f'post:{self.post.pk}')
+        failure = mock.patch(
+            'posts.views.get_object_or_404',
+            side_effect=OperationalError('database is locked')
+        )
+        with failure, self.assertLogs('posts.cache', 'WARNING'):
+            response = self.guest_client.get(url)
+        self.assertEqual(response.content, old.content)
+        cache.clear()
+        with failure, self.assertRaises(OperationalError):
+            self.guest_client.get(url)
+
+    def test_coalescing(self):
+        """Identical renders running at once are made once."""
+        waiting = threading.Event()
+        rendered = threading.Event()
+        calls = []
+
+        class WatchedFuture(Future):
+            def result(self, timeout=None):
+                waiting.set()
+                return super().result(timeout)
+
+        def render():
+            calls.append(1)
+            rendered.wait(5)
+            return 'page'
+
+        results = []
+
+        def request():
+            results.append(page_cache._coalesced('key', render))
+
+        with mock.patch.object(page_cache, 'Future', WatchedFuture):
+            leader = threading.Thread(target=request)
+            leader.start()
+            while not calls:
+                leader.join(0.01)
+            follower = threading.Thread(target=request)
+            follower.start()
+            waiting.wait(5)
+            rendered.set()
+            leader.join()
+            follower.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [results[0]] * 2)
+
+
+class EdgeCacheTests(TestConfig):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeEdgeServer().start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.server.purges.clear()
+
+    def test_surrogate_keys(self):
+        """Pages are tagged with keys of everything they show."""
+        card = {
+            f'post:{self.post.pk}', f'author:{self.post_author.pk}',
+            'group:test-group'
+        }
+        commenter = User.objects.create_user(username='commenter')
+        Comment.objects.create(post=self.post, author=commenter, text='hi')
+        pages = {
+            reverse('posts:index'): {'feed:index', *card},
+            reverse('posts:group_list', kwargs={'slug': 'test-group'}): card,
+            reverse('posts:profile', kwargs={'username': 'test_author'}):
+                card,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}):
+                {*card, f'author:{commenter.pk}'},
+            reverse('posts:search') + '?q=text': {'feed:index', *card},
+        }
+        for page, keys in pages.items():
+            with self.subTest(page=page):
+                for _ in range(2):
+                    # The page's copy cached for guests keeps its keys.
+                    response = self.guest_client.get(page)
+                    self.assertEqual(
+                        set(response['Surrogate-Key'].split()), keys
+                    )
+
+    def test_users_pages(self):
+        """Users' pages are not tagged, cached post cards aren't read."""
+        page = reverse('posts:index')
+        self.authorized_client.get(page)
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_client.get(page)
+        self.assertFalse(response.has_header('Surrogate-Key'))
+        self.assertFalse(any(
+            Post._meta.db_table in query['sql']
+            for query in context.captured_queries
+        ))
+
+    def test_purges(self):
+        """Changes purge the keys of pages showing them after commit."""
+        author = f'author:{self.post_author.pk}'
+        post = Post.objects.get(pk=self.post.pk)
+
+        def rename():
+            user = User.objects.get(pk=self.post_author.pk)
+            user.first_name = 'Переименованный'
+            user.save(update_fields=['first_name'])
+
+        changes = (
+            (lambda: self.author.post(
+                reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+                {'text': 'edited', 'group': ''}
+            ), {'feed:index', f'post:{post.pk}', author, 'group:test-group'}),
+            (lambda: self.authorized_client.post(
+                reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+                {'text': 'comment'}
+            ), {f'post:{post.pk}'}),
+            (lambda: Group.objects.get(slug='test-group').save(),
+             {'group:test-group'}),
+            (lambda: self.authorized_client.get(reverse(
+                'posts:profile_follow', kwargs={'username': 'test_author'}
+            )), {author}),
+            (rename, {author}),
+            (lambda: self.author.get(
+                reverse('posts:delete_post', kwargs={'post_id': post.pk})
+            ), {'feed:index', f'post:{post.pk}', author}),
+        )
+        at_once = mock.patch.object(
+            transaction, 'on_commit', lambda callback: callback()
+        )
+        with override_settings(EDGE_PURGE_URL=self.server.url), at_once:
+            for change, keys in changes:
+                with self.subTest(keys=keys):
+                    self.server.purges.clear()
+                    change()
+                    edge.shutdown()
+                    self.assertEqual(self.server.keys(), keys)
+                    self.assertEqual(
+                        {method for method, _ in self.server.purges},
+                        {'PURGE'}
+                    )
+            self.server.purges.clear()
+            self.post_author.save(update_fields=['last_login'])
+            edge.shutdown()
+            self.assertEqual(self.server.purges, [])
+
+    def test_shared_max_age(self):
+        """With purges on, the edge keeps guests' pages for long."""
+        url = reverse('posts:index')
+        self.assertNotIn(
+            's-maxage', self.guest_client.get(url)['Cache-Control']
+        )
+        with override_settings(EDGE_PURGE_URL=self.server.url):
+            self.assertIn(
+                f's-maxage={settings.EDGE_MAX_AGE}',
+                self.guest_client.get(url)['Cache-Control']
+            )
+            self.assertNotIn(
+                's-maxage', self.author.get(url)['Cache-Control']
+            )
+
 
 class PostFollow(TestConfig):
     def setUp(self):
@@ -287,3 +818,326 @@ class PostFollow(TestConfig):
             Post.objects.get(text='Test_post_2'),
             page_obj
         )
+
+
+class FeedQueriesTest(TestCase):
+    """Feed pages cost the same amount of queries for any page size."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        for number in range(settings.SHOWN_POSTS_COUNT):
+            author = User.objects.create_user(username=f'author_{number}')
+            group = Group.objects.create(
+                title=f'group_{number}',
+                slug=f'group-{number}',
+                description='description'
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            post = Post.objects.create(
+                text=f'{number}_text', author=author, group=group
+            )
+            Comment.objects.create(post=post, author=author, text='comment')
+        cls.post = post
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+        self.client = Client()
+        self.client.force_login(FeedQueriesTest.reader)
+
+    def test_feed_queries(self):
+        """Author and group are not fetched per post."""
+        post = FeedQueriesTest.post
+        pages = {
+            reverse('posts:index'): 1,
+            reverse(
+                'posts:group_list', kwargs={'slug': post.group.slug}
+            ): 2,
+            reverse(
+                'posts:profile', kwargs={'username': post.author.username}
+            ): 2,
+            # And the post's author for the cache key, once.
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}): 3,
+        }
+        for page, queries in pages.items():
+            with self.subTest(page=page):
+                with self.assertNumQueries(queries):
+                    self.guest.get(page)
+
+    def test_follow_queries(self):
+        """Follow's feed is not fetched per post."""
+        with self.assertNumQueries(3):
+            self.client.get(reverse('posts:follow_index'))
+
+    def test_feed_query_plans(self):
+        """Feeds are read through indexes, without scans and sorts."""
+        post = FeedQueriesTest.post
+        # Follow's feed merges the timeline with celebrities' posts,
+        # both are read by index, but have to be sorted together.
+        pages = (
+            (self.guest, reverse('posts:index'), False),
+            (self.guest, reverse(
+                'posts:group_list', kwargs={'slug': post.group.slug}
+            ), False),
+            (self.guest, reverse(
+                'posts:profile', kwargs={'username': post.author.username}
+            ), False),
+            (self.guest, reverse(
+                'posts:post_detail', kwargs={'post_id': post.pk}
+            ), False),
+            (self.client, reverse('posts:follow_index'), True),
+        )
+        for client, page, sorted_ in pages:
+            with CaptureQueriesContext(connection) as context:
+                client.get(page)
+            for query in context.captured_queries:
+                for step in query_plan(query['sql']):
+                    with self.subTest(page=page, step=step):
+                        if step.startswith(('SCAN', 'SEARCH')):
+                            self.assertRegex(
+                                step, 'USING .*(INDEX|PRIMARY KEY)'
+                            )
+                        if not sorted_:
+                            self.assertNotIn('TEMP B-TREE', step)
+
+
+class CountersTests(TestConfig):
+    def stat(self):
+        return (
+            AuthorStat.objects.get(author=self.post_author).posts_count,
+            Group.objects.get(pk=CountersTests.group.pk).posts_count,
+        )
+
+    def test_counters_follow_views(self):
+        """Views keep counters of authors, groups and posts."""
+        recount()
+        self.assertEqual(self.stat(), (1, 1))
+        self.author.post(
+            reverse('posts:post_create'),
+            {'text': 'new', 'group': CountersTests.group.pk}
+        )
+        self.assertEqual(self.stat(), (2, 2))
+        post = Post.objects.get(text='new')
+        self.author.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            {'text': 'new'}
+        )
+        self.assertEqual(self.stat(), (2, 1))
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            {'text': 'comment'}
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.author.get(
+            reverse('posts:delete_post', kwargs={'post_id': post.pk})
+        )
+        self.assertEqual(self.stat(), (1, 1))
+
+    def test_counters_follow_models(self):
+        """Admin, shell and cascade writes keep counters too."""
+        recount()
+        post = Post.objects.create(
+            text='new', author=self.post_author, group=CountersTests.group
+        )
+        self.assertEqual(self.stat(), (2, 2))
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='comment'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.group = None
+        post.save()
+        self.assertEqual(self.stat(), (2, 1))
+        Post.objects.filter(pk=post.pk).delete()
+        self.assertEqual(self.stat(), (1, 1))
+        author_id = self.post_author.pk
+        self.post_author.delete()
+        self.assertEqual(
+            Group.objects.get(pk=CountersTests.group.pk).posts_count, 0
+        )
+        self.assertFalse(AuthorStat.objects.filter(author_id=author_id))
+
+    def test_recount_repairs_drift(self):
+        """Recount command restores exact values."""
+        Group.objects.update(posts_count=100)
+        AuthorStat.objects.all().delete()
+        call_command('recount_counters', stdout=StringIO())
+        self.assertEqual(self.stat(), (1, 1))
+
+
+class TimelineTests(TestConfig):
+    def feed(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_fan_out_on_write(self):
+        """Follow and new posts fill the timeline, unfollow purges it."""
+        Follow.objects.create(user=self.user, author=self.post_author)
+        post = Post.objects.create(text='new', author=self.post_author)
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user=self.user
+            ).values_list('post', flat=True)),
+            {TimelineTests.post.pk, post.pk}
+        )
+        self.assertEqual(self.feed(), [post, TimelineTests.post])
+        Follow.objects.get(user=self.user, author=self.post_author).delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user))
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(FOLLOW_FANOUT_LIMIT=0)
+    def test_fan_out_on_read(self):
+        """Posts of popular authors are read without the timeline."""
+        Follow.objects.create(user=self.user, author=self.post_author)
+        post = Post.objects.create(text='new', author=self.post_author)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user))
+        self.assertEqual(self.feed(), [post, TimelineTests.post])
+
+    @override_settings(FOLLOW_TIMELINE_SIZE=2)
+    def test_timeline_is_bounded(self):
+        """Backfill keeps only the newest entries."""
+        for number in range(3):
+            Post.objects.create(text=f'{number}', author=self.post_author)
+        Follow.objects.create(user=self.user, author=self.post_author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 2
+        )
+        self.assertEqual(
+            [post.text for post in self.feed()], ['2', '1']
+        )
+
+    @override_settings(FOLLOW_TIMELINE_SIZE=2)
+    def test_fan_out_is_bounded(self):
+        """New posts push the oldest entries out of the timeline."""
+        Follow.objects.create(user=self.user, author=self.post_author)
+        for number in range(3):
+            Post.objects.create(text=f'{number}', author=self.post_author)
+        self.assertEqual(
+            [post.text for post in self.feed()], ['2', '1']
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 2
+        )
+
+    @override_settings(FOLLOW_FANOUT_LIMIT=2, FOLLOW_FANOUT_RESUME=1)
+    def test_fan_out_after_unfollows(self):
+        """Author dropped to the resume border is pushed again by command."""
+        others = [
+            User.objects.create_user(username=f'other{number}')
+            for number in range(2)
+        ]
+        for user in (self.user, *others):
+            Follow.objects.create(user=user, author=self.post_author)
+        post = Post.objects.create(text='new', author=self.post_author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post))
+        Follow.objects.get(user=others[0]).delete()
+        call_command('resume_fan_out', stdout=StringIO())
+        self.assertFalse(TimelineEntry.objects.filter(post=post))
+        Follow.objects.get(user=others[1]).delete()
+        self.assertFalse(TimelineEntry.objects.filter(post=post))
+        self.assertEqual(self.feed(), [post, TimelineTests.post])
+        call_command('resume_fan_out', stdout=StringIO())
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(
+                user=self.user
+            ).values_list('post', flat=True)),
+            {TimelineTests.post.pk, post.pk}
+        )
+        newer = Post.objects.create(text='newer', author=self.post_author)
+        self.assertEqual(self.feed(), [newer, post, TimelineTests.post])
+        self.assertTrue(TimelineEntry.objects.filter(post=newer))
+
+    @override_settings(FOLLOW_TIMELINE_SIZE=2)
+    def test_rebuild(self):
+        """Rebuild makes the same timelines as fan-out did."""
+        other = User.objects.create_user(username='other')
+        for number in range(3):
+            Post.objects.create(text=f'{number}', author=other)
+        Follow.objects.create(user=self.user, author=self.post_author)
+        Follow.objects.create(user=self.user, author=other)
+        Follow.objects.create(user=other, author=self.post_author)
+        entries = set(TimelineEntry.objects.values_list('user', 'post'))
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list('user', 'post')), entries
+        )
+
+
+class SearchTests(TestConfig):
+    def found(self, query, **params):
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': query, **params}
+        )
+        return response.context['page_obj']
+
+    def test_stemming(self):
+        """Other forms of the words are found."""
+        post = Post.objects.create(
+            text='Важная публикация о книгах', author=self.post_author
+        )
+        for query in ('публикации', 'важные', 'книга', 'КНИГИ'):
+            with self.subTest(query=query):
+                self.assertEqual(list(self.found(query)), [post])
+        self.assertEqual(list(self.found('газета')), [])
+        self.assertEqual(list(self.found('')), [])
+
+    def test_ranking_and_cursors(self):
+        """Better matches go first, pages follow cursors."""
+        best = Post.objects.create(
+            text='кот кот кот', author=self.post_author
+        )
+        others = [
+            Post.objects.create(
+                text=f'кот и {number} собак', author=self.post_author
+            )
+            for number in range(settings.SHOWN_POSTS_COUNT)
+        ]
+        first = self.found('коты')
+        self.assertEqual(first[0], best)
+        self.assertEqual(len(first), settings.SHOWN_POSTS_COUNT)
+        second = self.found('коты', cursor=first.next_cursor())
+        self.assertEqual(
+            {post.pk for post in list(first) + list(second)},
+            {post.pk for post in [best] + others}
+        )
+        self.assertIsNone(second.next_cursor())
+        back = self.found('коты', cursor=second.previous_cursor())
+        self.assertEqual(list(back), list(first))
+        self.assertIsNone(back.previous_cursor())
+
+    def test_index_follows_posts(self):
+        """Edited and deleted posts are reindexed."""
+        post = Post.objects.create(
+            text='старый текст', author=self.post_author
+        )
+        post.text = 'новый текст'
+        post.save()
+        self.assertEqual(list(self.found('старый')), [])
+        self.assertEqual(list(self.found('новые')), [post])
+        post.delete()
+        self.assertEqual(list(self.found('новые')), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(
+            list(self.found(SearchTests.post.text)), [SearchTests.post]
+        )
+
+    @override_settings(POST_SEARCH_BACKEND='posts.search.ScanBackend')
+    def test_scan_backend(self):
+        """Backend without an index finds words as they are written."""
+        post = Post.objects.create(text='кот и пёс', author=self.post_author)
+        self.assertEqual(list(self.found('кот пёс')), [post])
+        self.assertEqual(list(self.found('коты')), [])
+
+    def test_incomplete_backend(self):
+        """Backend missing a method of the interface is not made."""
+        class IndexOnly(SearchBackend):
+            def index(self, post):
+                pass
+
+        with self.assertRaises(TypeError):
+            IndexOnly()
@@ -0,0 +1,178 @@
+"""
+Post's thumbnails made in background.
+
+Uploaded images get their renditions (every POST_IMAGE_WIDTHS width
+of the POST_IMAGE_SIZE crop in every supported POST_IMAGE_FORMATS format)
+from a pool of THUMBNAIL_WORKERS threads right after the commit.
+{% post_picture %} (and {% thumbnail %}) only looks renditions up in
+sorl's key-value store; missing ones are scheduled and a placeholder
+is shown meanwhile. When renditions are ready, posts with the image are
+touched, so their cached cards and pages are rendered again.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from PIL import features
+from sorl.thumbnail import default, delete
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import DummyImageFile, ImageFile
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+CONTENT_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+}
+
+
+@lru_cache()
+def supported(image_format) -> bool:
+    """Checks Pillow is built with the format's encoder."""
+    if image_format == 'WEBP':
+        return features.check('webp')
+    return True
+
+
+def configured_renditions():
+    """Returns (geometry, options) of every configured rendition."""
+    width, height = map(int, settings.POST_IMAGE_SIZE.split('x'))
+    return tuple(
+        (
+            f'{size}x{round(size * height / width)}',
+            {'crop': 'center', 'upscale': True, 'format': image_format},
+        )
+        for image_format in settings.POST_IMAGE_FORMATS
+        if supported(image_format)
+        for size in settings.POST_IMAGE_WIDTHS
+    )
+
+
+def _storage():
+    return Post._meta.get_field('image').storage
+
+
+def _freeze(renditions):
+    return tuple(
+        (geometry, tuple(sorted(options.items())))
+        for geometry, options in renditions
+    )
+
+
+def generate(name, renditions=None):
+    """Makes renditions of the image and refreshes posts showing it."""
+    source = ImageFile(name, _storage())
+    for geometry, options in renditions or configured_renditions():
+        ThumbnailBackend.get_thumbnail(
+            default.backend, source, geometry, **dict(options)
+        )
+    for post in Post.objects.filter(image=name):
+        post.save(update_fields=('updated',))
+
+
+def release(name):
+    """
+    Deletes the image and its thumbnails after the commit
+    if no post refers to it anymore.
+    """
+    def cleanup():
+        if Post.objects.filter(image=name).exists():
+            return
+        try:
+            delete(ImageFile(name, _storage()))
+        except Exception:
+            logger.exception('Image %s is not deleted', name)
+    if name:
+        transaction.on_commit(cleanup)
+
+
+def _run(name, renditions):
+    try:
+        generate(name, renditions)
+    except Exception:
+        logger.exception('Thumbnails of %s are not made', name)
+    finally:
+        with _lock:
+            _pending.discard((name, renditions))
+        close_old_connections()
+
+
+def _submit(name, renditions):
+    global _executor
+    with _lock:
+        if (name, renditions) in _pending:
+            return
+        _pending.add((name, renditions))
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                settings.THUMBNAIL_WORKERS, thread_name_prefix='thumbnails'
+            )
+    _executor.submit(_run, name, renditions)
+
+
+def shutdown():
+    """Waits for the thumbnails being made and stops the workers."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def schedule(post, renditions=None):
+    """
+    Makes renditions of the post's image after the commit.
+    Without workers they are made at once.
+    """
+    renditions = _freeze(renditions or configured_renditions())
+
+    def submit():
+        if not post.image:
+            return
+        if settings.THUMBNAIL_WORKERS:
+            _submit(post.image.name, renditions)
+        else:
+            generate(post.image.name, renditions)
+    transaction.on_commit(submit)
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    """Returns ready thumbnails only and schedules the missing ones."""
+
+    def lookup(self, file_, geometry_string, **options):
+        """Returns the thumbnail from the key-value store or None."""
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not settings.THUMBNAIL_WORKERS:
+            return super().get_thumbnail(file_, geometry_string, **options)
+        thumbnail = self.lookup(file_, geometry_string, **options)
+        if thumbnail:
+            return thumbnail
+        renditions = _freeze([(geometry_string, options)])
+        name = file_.name if hasattr(file_, 'name') else file_
+        transaction.on_commit(lambda: _submit(name, renditions))
+        return DummyImageFile(geometry_string)
@@ -0,0 +1,193 @@
+"""
+Materialized follow's timelines (fan-out-on-write).
+
+A new post is pushed to the timelines of the author's followers,
+a new follow backfills the author's latest posts, unfollow purges them;
+timelines are trimmed to FOLLOW_TIMELINE_SIZE entries after every push.
+An author passing FOLLOW_FANOUT_LIMIT followers is switched to
+fan-out-on-read: their posts are not pushed but joined to the timeline
+on read. "manage.py resume_fan_out" backfills the followers of authors
+dropped to FOLLOW_FANOUT_RESUME and switches them back; the gap between
+the two settings keeps an author at the border from flapping.
+Disabled FOLLOW_TIMELINE means pure fan-out-on-read.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import OuterRef, Q, Subquery
+
+from .models import AuthorStat, Follow, Post, TimelineEntry
+
+
+def enabled():
+    return settings.FOLLOW_TIMELINE
+
+
+def is_celebrity(author_id) -> bool:
+    return AuthorStat.objects.filter(
+        author_id=author_id, fan_out_on_read=True
+    ).exists()
+
+
+def _push(entries):
+    # Batches are sized by the backend: SQLite limits rows per INSERT.
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Pushes a new post to the timelines of author's followers."""
+    if not enabled() or is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _push(
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+    trim(followers)
+
+
+def backfill(user_id, author_id):
+    """Pushes the latest author's posts to the new follower's timeline."""
+    if not enabled() or is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    )[:settings.FOLLOW_TIMELINE_SIZE]
+    _push(
+        TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for pk, pub_date in posts
+    )
+    trim([user_id])
+
+
+def followed(author_id):
+    """Switches the author to fan-out-on-read past FOLLOW_FANOUT_LIMIT."""
+    AuthorStat.objects.filter(
+        author_id=author_id,
+        fan_out_on_read=False,
+        followers_count__gt=settings.FOLLOW_FANOUT_LIMIT
+    ).update(fan_out_on_read=True)
+
+
+def resumable():
+    """Returns ids of authors read on request to be pushed again."""
+    return AuthorStat.objects.filter(
+        fan_out_on_read=True,
+        followers_count__lte=settings.FOLLOW_FANOUT_RESUME
+    ).values_list('author_id', flat=True)
+
+
+def _push_to_followers(posts, author_id, batch_size=500):
+    if not enabled():
+        return
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator()
+    while True:
+        chunk = list(islice(followers, batch_size))
+        if not chunk:
+            return
+        with transaction.atomic():
+            _push(
+                TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+                for user_id in chunk
+                for pk, pub_date in posts
+            )
+            trim(chunk)
+
+
+def resume(author_id):
+    """
+    Backfills the author's followers in short transactions, then
+    switches the author back to fan-out-on-write. Until then the posts
+    are still joined on read, so the timelines stay complete; posts
+    published during the backfill are pushed at the switch.
+    Returns False when the author is not resumable any more.
+    """
+    posts = list(Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    )[:settings.FOLLOW_TIMELINE_SIZE])
+    _push_to_followers(posts, author_id)
+    with transaction.atomic():
+        if not AuthorStat.objects.filter(
+            author_id=author_id,
+            fan_out_on_read=True,
+            followers_count__lte=settings.FOLLOW_FANOUT_RESUME
+        ).update(fan_out_on_read=False):
+            return False
+        newest = max((pk for pk, pub_date in posts), default=0)
+        _push_to_followers(
+            list(Post.objects.filter(
+                author_id=author_id, pk__gt=newest
+            ).values_list('pk', 'pub_date')),
+            author_id
+        )
+    return True
+
+
+def purge(user_id, author_id):
+    """Removes author's posts from the former follower's timeline."""
+    TimelineEntry.objects.filter(
+        user_id=user_id,
+        post__in=Post.objects.filter(author_id=author_id)
+    ).delete()
+
+
+def trim(user_ids):
+    """
+    Drops entries older than FOLLOW_TIMELINE_SIZE newest ones
+    of the users' timelines with a single query.
+    """
+    border = TimelineEntry.objects.filter(
+        user_id=OuterRef('user_id')
+    ).order_by('-pub_date').values('pub_date')[
+        settings.FOLLOW_TIMELINE_SIZE:settings.FOLLOW_TIMELINE_SIZE + 1
+    ]
+    TimelineEntry.objects.filter(
+        user_id__in=user_ids, pub_date__lte=Subquery(border)
+    ).delete()
+
+
+def rebuild():
+    """
+    Fills all timelines again from follows with a single query:
+    the newest FOLLOW_TIMELINE_SIZE posts of non-celebrities per user.
+    """
+    TimelineEntry.objects.all().delete()
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            '(user_id, post_id, pub_date) '
+            'SELECT user_id, post_id, pub_date FROM ('
+            'SELECT follow.user_id, post.id AS post_id, post.pub_date, '
+            'ROW_NUMBER() OVER (PARTITION BY follow.user_id '
+            'ORDER BY post.pub_date DESC, post.id DESC) AS recency '
+            f'FROM {Follow._meta.db_table} follow '
+            f'JOIN {Post._meta.db_table} post '
+            'ON post.author_id = follow.author_id '
+            f'LEFT JOIN {AuthorStat._meta.db_table} stat '
+            'ON stat.author_id = follow.author_id '
+            'WHERE COALESCE(stat.fan_out_on_read, %s) = %s'
+            ') entries WHERE recency <= %s',
+            [False, False, settings.FOLLOW_TIMELINE_SIZE]
+        )
+
+
+def follow_feed(user):
+    """Returns posts of the authors followed by the user."""
+    if not enabled():
+        return Post.objects.filter(author__following__user=user)
+    timeline = TimelineEntry.objects.filter(user=user).order_by(
+        '-pub_date'
+    ).values('post')[:settings.FOLLOW_TIMELINE_SIZE]
+    celebrities = Follow.objects.filter(
+        user=user, author__stat__fan_out_on_read=True
+    ).values('author')
+    return Post.objects.filter(
+        Q(pk__in=timeline) | Q(author__in=celebrities)
+    )
@@ -0,0 +1,96 @@
+"""
+Bounded image uploads.
+
+Uploads bigger than FILE_UPLOAD_MAX_MEMORY_SIZE are streamed to
+a temporary file; nothing past POST_IMAGE_MAX_BYTES is written, while the
+file's size still counts every byte, so check_limits() rejects it.
+check_limits() reads the pixel count from the image's header only,
+then normalize() drops metadata and downsamples originals larger than
+POST_IMAGE_MAX_SIDE once, so later renditions start from a small image.
+"""
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+NORMALIZED_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """Streams the upload to disk up to POST_IMAGE_MAX_BYTES."""
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) <= settings.POST_IMAGE_MAX_BYTES:
+            self.file.write(raw_data)
+
+
+def _source(uploaded):
+    if hasattr(uploaded, 'temporary_file_path'):
+        return uploaded.temporary_file_path()
+    uploaded.seek(0)
+    return uploaded
+
+
+def pixels(uploaded) -> int:
+    """Returns width * height read from the image's header only."""
+    try:
+        with Image.open(_source(uploaded)) as image:
+            width, height = image.size
+    except Image.DecompressionBombError:
+        return settings.POST_IMAGE_MAX_PIXELS + 1
+    except (UnidentifiedImageError, OSError):
+        # Not an image at all, ImageField reports it.
+        return 0
+    finally:
+        uploaded.seek(0)
+    return width * height
+
+
+def check_limits(uploaded):
+    """Raises ValidationError if the upload is over the limits."""
+    if uploaded.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Размер файла больше %(limit)s МБ.',
+            code='too_large',
+            params={'limit': settings.POST_IMAGE_MAX_BYTES // 2 ** 20},
+        )
+    if pixels(uploaded) > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Изображение больше %(limit)s мегапикселей.',
+            code='too_many_pixels',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+
+
+def normalize(uploaded):
+    """
+    Returns the upload without EXIF and not larger than
+    POST_IMAGE_MAX_SIDE. Images which need neither are returned as is.
+    """
+    side = settings.POST_IMAGE_MAX_SIDE
+    with Image.open(_source(uploaded)) as image:
+        clean = not image.getexif() and 'exif' not in image.info
+        small = max(image.size) <= side
+        if (
+            image.format not in NORMALIZED_FORMATS
+            or getattr(image, 'is_animated', False)
+            or clean and small
+        ):
+            uploaded.seek(0)
+            return uploaded
+        image_format = image.format
+        # JPEG is decoded right at a reduced scale.
+        image.draft(None, (side, side))
+        normalized = ImageOps.exif_transpose(image)
+        normalized.thumbnail((side, side))
+    output = SpooledTemporaryFile(settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    normalized.save(output, image_format, exif=b'', quality=90)
+    size = output.tell()
+    output.seek(0)
+    return UploadedFile(
+        output, uploaded.name, uploaded.content_type, size, uploaded.charset
+    )
@@ -1,13 +1,261 @@
+import base64
+import binascii
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
 
 from .models import Follow
 
 
-def page_object(request, objects):
-    paginator = Paginator(objects, settings.SHOWN_POSTS_COUNT)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+CURSOR_NEXT = 'n'
+CURSOR_PREVIOUS = 'p'
+
+
+def encode_cursor(direction, position):
+    """Packs direction and (date, pk) of a border object to opaque string."""
+    date, pk = position
+    raw = f'{direction}{date.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Unpacks cursor made by encode_cursor.
+    Returns (direction, (date, pk)) or None if cursor is broken.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        direction, raw = raw[0], raw[1:]
+        date, pk = raw.rsplit('|', 1)
+        date, pk = parse_datetime(date), int(pk)
+    except (binascii.Error, UnicodeError, ValueError, IndexError):
+        return None
+    if direction not in (CURSOR_NEXT, CURSOR_PREVIOUS) or date is None:
+        return None
+    return direction, (date, pk)
+
+
+class KeysetWindow:
+    """
+    Lazy slice of objects placed right after (or before) a border object.
+    Objects are ordered by (date, pk) descending and selected with
+    a seek condition instead of OFFSET, so any page costs as much as the
+    first one. Nothing is fetched until the window is iterated.
+    """
+    def __init__(self, objects, per_page, field, position=None,
+                 backwards=False):
+        self.objects = objects
+        self.per_page = per_page
+        self.field = field
+        self.position = position
+        self.backwards = backwards
+        self._rows = None
+        self._has_more = False
+
+    def _fetch(self):
+        if self._rows is not None:
+            return self._rows
+        ordering = (f'-{self.field}', '-pk')
+        objects = self.objects
+        if self.position is not None:
+            date, pk = self.position
+            lookup = 'gt' if self.backwards else 'lt'
+            objects = objects.filter(
+                Q(**{f'{self.field}__{lookup}': date})
+                | Q(**{self.field: date, f'pk__{lookup}': pk})
+            )
+        if self.backwards:
+            ordering = (self.field, 'pk')
+        rows = list(objects.order_by(*ordering)[:self.per_page + 1])
+        self._has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if self.backwards:
+            rows.reverse()
+        self._rows = rows
+        return rows
+
+    def _border(self, obj):
+        return getattr(obj, self.field), obj.pk
+
+    def next_cursor(self):
+        """Returns cursor of the next page or None if it is the last one."""
+        rows = self._fetch()
+        if not rows or not (self.backwards or self._has_more):
+            return None
+        return encode_cursor(CURSOR_NEXT, self._border(rows[-1]))
+
+    def previous_cursor(self):
+        """Returns cursor of the previous page or None for the first one."""
+        rows = self._fetch()
+        if self.position is None or not rows:
+            return None
+        if self.backwards and not self._has_more:
+            return None
+        return encode_cursor(CURSOR_PREVIOUS, self._border(rows[0]))
+
+    def __iter__(self):
+        return iter(self._fetch())
+
+    def __len__(self):
+        return len(self._fetch())
+
+    def __getitem__(self, index):
+        return self._fetch()[index]
+
+
+class WindowedPage(Page):
+    """Page which links to a window of pages around itself."""
+
+    @property
+    def elided_page_range(self):
+        return self.paginator.get_elided_page_range(self.number)
+
+
+class KeysetPaginator(Paginator):
+    """
+    Paginator which additionally supports cursor ("seek") pages.
+    Numbered pages (get_page) still work through OFFSET and COUNT(*),
+    cursor pages (get_cursor_page) need neither of them.
+    Given a count callable, numbered pages take the (approximate) total
+    from it instead of COUNT(*); numbers past it give the last page,
+    which shows a full page even if the feed has grown since.
+    """
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, field='pub_date', count=None,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.field = field
+        self.count_callable = count
+
+    @cached_property
+    def count(self):
+        if self.count_callable is not None:
+            return self.count_callable()
+        return super().count
+
+    def page(self, number):
+        if self.count_callable is None:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+
+    def _get_page(self, *args, **kwargs):
+        return WindowedPage(*args, **kwargs)
+
+    def get_elided_page_range(self, number, on_each_side=2, on_ends=1):
+        """
+        Yields numbers of the first and the last on_ends pages and
+        on_each_side pages around the number, ELLIPSIS in the gaps.
+        """
+        last = self.num_pages
+        if last <= (on_each_side + on_ends + 1) * 2:
+            yield from self.page_range
+            return
+        if number - on_each_side > on_ends + 2:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number + on_each_side < last - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(last - on_ends + 1, last + 1)
+        else:
+            yield from range(number + 1, last + 1)
+
+    def get_cursor_page(self, cursor=None):
+        """
+        Returns a page placed after (or before) the cursor.
+        Broken or empty cursor gives the first page.
+        Page number is unknown without counting, so it is None.
+        Page gets next_cursor() and previous_cursor() methods.
+        """
+        decoded = decode_cursor(cursor) if cursor else None
+        position, backwards = None, False
+        if decoded is not None:
+            direction, position = decoded
+            backwards = direction == CURSOR_PREVIOUS
+        window = KeysetWindow(
+            self.object_list, self.per_page, self.field, position, backwards
+        )
+        page = Page(window, None, self)
+        page.next_cursor = window.next_cursor
+        page.previous_cursor = window.previous_cursor
+        return page
+
+
+def estimate_count(model):
+    """
+    Returns rows count of the model's table from the database statistics
+    (ANALYZE) or None if there are no statistics.
+    """
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            if 'sqlite_stat1' not in connection.introspection.table_names(
+                cursor
+            ):
+                return None
+            cursor.execute(
+                'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                [table]
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [table]
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return int(str(row[0]).split()[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for huge tables. An unfiltered queryset is counted from
+    the database statistics, a filtered one is counted exactly but not
+    further than COUNT_LIMIT rows, so COUNT(*) never scans the table.
+    Without statistics (ANALYZE never run) or with statistics of a small
+    table an unfiltered queryset is counted exactly: a capped count
+    would hide the pages past COUNT_LIMIT.
+    """
+    COUNT_LIMIT = 10000
+
+    @cached_property
+    def count(self):
+        objects = self.object_list.order_by()
+        if not objects.query.where:
+            estimate = estimate_count(objects.model)
+            if estimate is not None and estimate > self.COUNT_LIMIT:
+                return estimate
+            return objects.count()
+        return objects[:self.COUNT_LIMIT].count()
+
+
+def page_object(request, objects, count=None):
+    """
+    Returns a page of objects.
+    Cursor pages are used by default; numbered pages only on ?page=N,
+    counted by the count callable if given.
+    """
+    paginator = KeysetPaginator(
+        objects, settings.SHOWN_POSTS_COUNT, count=count
+    )
+    if 'page' in request.GET:
+        return paginator.get_page(request.GET.get('page'))
+    return paginator.get_cursor_page(request.GET.get('cursor'))
 
 
 def is_follow(request, author) -> bool:
@@ -1,60 +1,125 @@
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
+from core import edge
+from core.replicas import read_replica
+
+from . import counters, timelines
+from .cache import cache_generations
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
+from .search import search_page
 from .utils import is_follow, page_object
 
 
-@cache_page(20)
+def _tagged(request, response, *keys, posts=()):
+    """
+    Tags guests' responses with the keys and the keys of posts' cards.
+    Users' responses are private, the edge doesn't keep them; their
+    pages may also be cached fragments, which are not to be queried.
+    """
+    if request.user.is_authenticated:
+        return response
+    for post in posts:
+        keys += (f'post:{post.pk}', f'author:{post.author_id}')
+        if post.group_id is not None:
+            keys += (f'group:{post.group.slug}',)
+    return edge.tag(response, *keys)
+
+
+@read_replica
+@cache_generations('feed', 'users', 'groups')
 def index(request):
     """Returns main page."""
-    posts = Post.objects.all()
-    return render(
-        request,
-        'posts/index.html',
-        {'page_obj': page_object(request, posts)}
-    )
+    posts = Post.objects.for_feed()
+    page = page_object(request, posts, partial(counters.feed_count, 'feed'))
+    response = render(request, 'posts/index.html', {'page_obj': page})
+    return _tagged(request, response, 'feed:index', posts=page)
 
 
+@read_replica
+@cache_generations('group:{slug}', 'users', 'groups')
 def group_posts(request, slug):
     """Returns the posts of selected group."""
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
+    posts = group.posts.for_feed()
     context = {
         'group': group,
-        'page_obj': page_object(request, posts),
+        'page_obj': page_object(
+            request, posts, partial(counters.feed_count, 'group', group.pk)
+        ),
     }
-    return render(request, 'posts/group_list.html', context)
+    response = render(request, 'posts/group_list.html', context)
+    return _tagged(
+        request, response, f'group:{group.slug}', posts=context['page_obj']
+    )
 
 
+@read_replica
+@cache_generations('profile:{username}', 'users', 'groups')
 def profile(request, username):
     """Returns page with posts of selected author."""
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
+    author = get_object_or_404(
+        User.objects.select_related('stat'),
+        username=username
+    )
+    posts = author.posts.for_feed()
     context = {
         'author': author,
-        'page_obj': page_object(request, posts),
+        'page_obj': page_object(
+            request, posts, partial(counters.feed_count, 'profile', author.pk)
+        ),
         'following': is_follow(request, author),
     }
-    return render(request, 'posts/profile.html', context)
+    response = render(request, 'posts/profile.html', context)
+    return _tagged(
+        request, response, f'author:{author.pk}', posts=context['page_obj']
+    )
+
 
+def _author_scope(post_id):
+    """Scope of the post's author: the page shows their post count."""
+    key = f'post-author:{post_id}'
+    author_id = cache.get(key)
+    if author_id is None:
+        author_id = Post.objects.filter(pk=post_id).values_list(
+            'author_id', flat=True
+        ).order_by().first()
+        if author_id is not None:
+            # The author of a post never changes.
+            cache.set(key, author_id, settings.PAGE_CACHE_TIMEOUT)
+    return f'author:{author_id}'
 
-@cache_page(20)
+
+@read_replica
+@cache_generations('post:{post_id}', _author_scope, 'users', 'groups')
 def post_detail(request, post_id):
     """Returns page with selected post's details."""
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.for_feed().select_related('author__stat'),
+        pk=post_id
+    )
+    comments = post.comments.select_related('author')
     form = CommentForm()
-    return render(
+    response = render(
         request,
         'posts/post_detail.html',
         {'post': post, 'form': form, 'comments': comments}
     )
+    return _tagged(
+        request, response,
+        *(f'author:{comment.author_id}' for comment in comments),
+        posts=[post]
+    )
 
 
 @login_required
+@transaction.atomic
 def post_create(request):
     """Returns page for creation a new post."""
     form = PostForm(
@@ -74,6 +139,7 @@ def post_create(request):
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
     """
     Allows to edit post's (text and/or group) to its author.
@@ -98,6 +164,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def delete_post(request, post_id):
     """Deletes post if user is post's author."""
     post = get_object_or_404(Post, id=post_id)
@@ -108,6 +175,7 @@ def delete_post(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     """Adds comment to post's object."""
     post = get_object_or_404(Post, id=post_id)
@@ -120,15 +188,30 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@read_replica
 @login_required
 def follow_index(request):
     """Fills page with posts of followed authors."""
-    posts = Post.objects.filter(author__following__user=request.user)
+    posts = timelines.follow_feed(request.user).for_feed()
+    count = partial(counters.feed_count, 'follow', request.user.pk)
     return render(
         request,
         'posts/follow.html',
-        {'page_obj': page_object(request, posts)}
+        {'page_obj': page_object(request, posts, count)}
+    )
+
+
+def search(request):
+    """Returns page of posts found by ?q= ranked by relevance."""
+    query = request.GET.get('q', '').strip()
+    page = search_page(query, request.GET.get('cursor'))
+    response = render(
+        request,
+        'posts/search.html',
+        {'query': query, 'page_obj': page}
     )
+    # Any new post may be found.
+    return _tagged(request, response, 'feed:index', posts=page)
 
 
 @login_required
@@ -40,6 +40,44 @@ CACHES = {
     }
 }
 
+# Shared cache for several workers: CACHE_URL=redis://host:6379/0.
+# Each process keeps hot keys in its memory for CACHE_L1_TIMEOUT seconds,
+# so a bumped generation token may be seen by other workers that late.
+CACHE_URL = os.getenv('CACHE_URL')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.tiered.TieredCache',
+            'OPTIONS': {
+                'SHARED': 'shared',
+                'L1_TIMEOUT': int(os.getenv('CACHE_L1_TIMEOUT', 5)),
+            },
+        },
+        'shared': {
+            'BACKEND': 'core.cache.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        },
+    }
+
+# Cached pages are invalidated by posts.signals and expire after
+# PAGE_CACHE_TIMEOUT. A stale page is kept PAGE_STALE_TIMEOUT more
+# seconds to be served while it's rendered again or the database fails.
+PAGE_CACHE_TIMEOUT = 60 * 60
+PAGE_STALE_TIMEOUT = 24 * 60 * 60
+# Browsers and proxies revalidate cached pages (ETag, Last-Modified)
+# after PAGE_MAX_AGE seconds; pages of logged in users are private.
+PAGE_MAX_AGE = 0
+
+# HTTP edge cache (core.edge): pages carry surrogate keys, changes purge
+# them with EDGE_PURGE_METHOD requests to EDGE_PURGE_URL (off if empty).
+# With purges on, the edge keeps guests' pages for EDGE_MAX_AGE seconds
+# (s-maxage), browsers still revalidate after PAGE_MAX_AGE.
+SURROGATE_KEY_HEADER = 'Surrogate-Key'
+EDGE_PURGE_URL = os.getenv('EDGE_PURGE_URL', '')
+EDGE_PURGE_METHOD = os.getenv('EDGE_PURGE_METHOD', 'PURGE')
+EDGE_PURGE_TIMEOUT = 2
+EDGE_MAX_AGE = 24 * 60 * 60
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -47,6 +85,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -58,6 +97,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -86,6 +126,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.page_cache.page_cache',
             ],
         },
     },
@@ -104,6 +145,44 @@ DATABASES = {
     }
 }
 
+# Read-only replicas for views marked @read_replica (core.replicas):
+# DATABASE_REPLICA_FILES=/replicas/one.sqlite3:/replicas/two.sqlite3.
+# After a write the client, and after a change of a page's data
+# every client, reads from the primary for REPLICA_PIN_SECONDS,
+# longer than the replication lag.
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+DATABASE_REPLICAS = []
+REPLICA_FILES = os.getenv('DATABASE_REPLICA_FILES', '')
+for path in filter(None, REPLICA_FILES.split(os.pathsep)):
+    alias = f'replica{len(DATABASE_REPLICAS)}'
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+REPLICA_PIN_SECONDS = 10
+
+# SQLite tuned for concurrent requests, opt-in by SQLITE_TUNING=1.
+# Pragmas are set on every new connection (core.db). WAL lets readers
+# go on while a writer commits; synchronous=NORMAL may lose the last
+# commits on power loss, but never corrupts the database. Connections
+# are kept open between requests for DB_CONN_MAX_AGE seconds.
+# Compare the profiles with "manage.py benchmark_sqlite".
+SQLITE_TUNED_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 2 ** 20,
+    'cache_size': -64 * 2 ** 10,
+    'temp_store': 'MEMORY',
+}
+SQLITE_PRAGMAS = {}
+if os.getenv('SQLITE_TUNING'):
+    SQLITE_PRAGMAS = SQLITE_TUNED_PRAGMAS
+    for database in DATABASES.values():
+        database['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', 600))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -149,9 +228,50 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 # Custom constants
 
 SHOWN_POSTS_COUNT = 10
+# Feeds' totals of numbered pages are approximate and refreshed
+# every FEED_COUNT_TIMEOUT seconds (posts.counters.feed_count).
+FEED_COUNT_TIMEOUT = 5 * 60
 POST_TITLE_LEN = 15
 
 
+# Follow's timelines (fan-out-on-write)
+
+FOLLOW_TIMELINE = True
+FOLLOW_TIMELINE_SIZE = 1000
+# Authors with more followers are read on request (fan-out-on-read).
+FOLLOW_FANOUT_LIMIT = 5000
+# Authors read on request are pushed again ("manage.py resume_fan_out")
+# once they drop to this many followers.
+FOLLOW_FANOUT_RESUME = 4000
+
+# Full-text search (posts.search); use posts.search.ScanBackend
+# for databases without SQLite's FTS5.
+
+POST_SEARCH_BACKEND = 'posts.search.SQLiteFTSBackend'
+
+# Post's thumbnails (made in background by posts.thumbnails)
+
+THUMBNAIL_BACKEND = 'posts.thumbnails.DeferredThumbnailBackend'
+# Post's image is cropped to POST_IMAGE_SIZE and shown via srcset
+# in every width and format; formats Pillow can't encode are skipped.
+POST_IMAGE_SIZE = '960x339'
+POST_IMAGE_WIDTHS = (320, 640, 960)
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+# 0 makes thumbnails on the request thread.
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+
+# Uploads (bounded and normalized by posts.uploads)
+
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'posts.uploads.BoundedUploadHandler',
+]
+POST_IMAGE_MAX_BYTES = 20 * 2 ** 20
+POST_IMAGE_MAX_PIXELS = 50 * 10 ** 6
+# Larger originals are downsampled once at upload.
+POST_IMAGE_MAX_SIDE = 2560
+
+
 # LogIn/LogOut management
 
 LOGIN_URL = 'users:login'